@@ -0,0 +1,269 @@
+"""
+Memoization of per-text analysis results, shared by all callbacks of a worker.
+
+One keystroke triggers several callbacks that analyze the same text (e.g. `on_raw_input_text_update` and
+`on_enter_input_text`, or `make_prediction` and `make_news_feature_highlights_bar_graph_div`). Results are cached by
+(model id, text) in a bounded LRU cache, so chained callbacks reuse one computation.
+
+When a callback passes a session id (one per page view), the last analysis of the session is kept too, and a new text
+of that session is analyzed incrementally from it (see `analysis/incremental_analyzer.py`): a keystroke only costs
+in proportion to the edit, not to the whole document.
+
+Other new texts are analyzed in batches: concurrent requests are grouped by a `MicroBatcher` (enabled with
+`MICRO_BATCH_WINDOW_MS` > 0), and `get_text_analyses` analyzes a list of texts at once. A batch is scored with one
+sparse matrix product, see `analyze_batch`.
+"""
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+
+from analysis.micro_batching import MicroBatcher
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache, bounded by number of entries and (estimated) total bytes.
+    """
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict() # key -> (value, nbytes)
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, nbytes=0):
+        with self._lock:
+            old_entry = self._entries.pop(key, None)
+            if old_entry is not None:
+                self.total_bytes -= old_entry[1]
+            if nbytes > self.max_bytes:
+                # Would evict everything else and still not fit
+                return
+            self._entries[key] = (value, nbytes)
+            self.total_bytes += nbytes
+
+            while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_nbytes
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class TextAnalysis:
+    """
+    Cached result for one text:
+
+    analyzed:      `AnalyzedText` (tokens, offsets, features, TF-IDF row `x`)
+    probs:         predicted probabilities, (n_classes,)
+    contributions: coefficient * TF-IDF value of each nonzero feature of `x` (in `x.indices` order),
+                   (n_nonzero_features, n_coef_rows), see `LinearScorer.contributions_row`
+    """
+    __slots__ = ['analyzed', 'probs', 'contributions']
+
+    def __init__(self, analyzed, probs, contributions):
+        self.analyzed = analyzed
+        self.probs = probs
+        self.contributions = contributions
+
+    @property
+    def nbytes(self):
+        """
+        Rough estimate of memory used.
+        """
+        analyzed = self.analyzed
+        arrays = [
+            analyzed.token_starts, analyzed.token_ends, analyzed.feature_ids,
+            analyzed.feature_token_starts, analyzed.feature_token_ends,
+            analyzed.x.data, analyzed.x.indices, analyzed.x.indptr,
+            self.probs, self.contributions,
+        ]
+        tokens_nbytes = sum(sys.getsizeof(t) for t in analyzed.tokens) + sys.getsizeof(analyzed.tokens)
+        return sum(a.nbytes for a in arrays) + sys.getsizeof(analyzed.text) + tokens_nbytes
+
+
+def analyze(model, raw_text):
+    return score_analyzed(model, model.analyzer.analyze(raw_text))
+
+def analyze_batch(model, raw_texts):
+    """
+    `TextAnalysis` of each of `raw_texts`, scoring all of them in one batched pass.
+    """
+    return score_analyzed_batch(model, [model.analyzer.analyze(raw_text) for raw_text in raw_texts])
+
+def analyze_batch_items(model, items):
+    """
+    Micro-batch of (raw_text, keep_state) items: (`TextAnalysis`, `IncrementalState` if keep_state else None) of each.
+    Texts of sessions are analyzed by the incremental analyzer, so that their next edit can start from the state.
+    """
+    states = [model.incremental_analyzer.analyze(raw_text) if keep_state else None for raw_text, keep_state in items]
+    analyzed_texts = [
+        state.analyzed if state is not None else model.analyzer.analyze(raw_text)
+        for (raw_text, _), state in zip(items, states)
+    ]
+    return list(zip(score_analyzed_batch(model, analyzed_texts), states))
+
+def score_analyzed_batch(model, analyzed_texts):
+    if len(analyzed_texts) == 1:
+        return [score_analyzed(model, analyzed_texts[0])]
+
+    X = sp.vstack([analyzed.x for analyzed in analyzed_texts], format='csr')
+    probs = model.scorer.predict_proba(X)
+    contributions = model.scorer.coef_by_feature[X.indices] * X.data[:, np.newaxis]
+    return [
+        TextAnalysis(analyzed, probs[i], contributions[X.indptr[i]: X.indptr[i + 1]].copy())
+        for i, analyzed in enumerate(analyzed_texts)
+    ]
+
+def score_analyzed(model, analyzed):
+    x = analyzed.x
+    return TextAnalysis(
+        analyzed,
+        model.scorer.predict_proba_row(x.indices, x.data),
+        model.scorer.contributions_row(x.indices, x.data),
+    )
+
+
+text_analysis_cache = LRUCache(
+    max_entries=int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 512)),
+    max_bytes=int(float(os.environ.get('ANALYSIS_CACHE_MAX_MB', 64)) * 1024 * 1024),
+)
+
+# (model id, session id) -> `IncrementalState` of the session's last analyzed text
+session_analysis_states = LRUCache(
+    max_entries=int(os.environ.get('INCREMENTAL_ANALYSIS_MAX_SESSIONS', 256)),
+    max_bytes=int(float(os.environ.get('INCREMENTAL_ANALYSIS_MAX_MB', 64)) * 1024 * 1024),
+)
+
+# An edit of more than this fraction of the new text is analyzed from scratch (e.g. a pasted or random text)
+INCREMENTAL_MAX_EDIT_FRACTION = 0.5
+
+def analyze_in_session(model_id, model, raw_text, session_id):
+    """
+    `TextAnalysis` of `raw_text`, incrementally from the session's previous text if there is one and the edit is small.
+    Full analyses go through the micro-batcher, like texts analyzed without session.
+    """
+    incremental_analyzer = model.incremental_analyzer
+    if incremental_analyzer is None:
+        return analyze_full(model_id, model, raw_text)
+
+    key = (model_id, session_id)
+    previous_state = session_analysis_states.get(key)
+    if previous_state is None or incremental_analyzer.edited_length(previous_state, raw_text) > INCREMENTAL_MAX_EDIT_FRACTION * len(raw_text):
+        result, state = analyze_full(model_id, model, raw_text, keep_state=True)
+    else:
+        state = incremental_analyzer.update(previous_state, raw_text)
+        result = score_analyzed(model, state.analyzed)
+    session_analysis_states.put(key, state, state.nbytes)
+    return result
+
+# Concurrent full analyses (of new texts) are grouped for up to `MICRO_BATCH_WINDOW_MS` (0: no batching), or until
+# `MICRO_BATCH_MAX_DOCUMENTS` are waiting. Each one may wait up to the window for others: a little latency per
+# request, for fewer scoring passes under load.
+MICRO_BATCH_WINDOW_MS = float(os.environ.get('MICRO_BATCH_WINDOW_MS', 2))
+MICRO_BATCH_MAX_DOCUMENTS = int(os.environ.get('MICRO_BATCH_MAX_DOCUMENTS', 32))
+
+micro_batchers = {} # model id -> `MicroBatcher`
+_micro_batchers_lock = threading.Lock()
+
+def get_micro_batcher(model_id, model):
+    batcher = micro_batchers.get(model_id)
+    if batcher is None:
+        with _micro_batchers_lock:
+            batcher = micro_batchers.get(model_id)
+            if batcher is None:
+                batcher = MicroBatcher(
+                    lambda items: analyze_batch_items(model, items),
+                    max_batch_size=MICRO_BATCH_MAX_DOCUMENTS,
+                    max_wait_seconds=MICRO_BATCH_WINDOW_MS / 1e3,
+                    name=f'micro-batcher-{model_id}',
+                )
+                micro_batchers[model_id] = batcher
+    return batcher
+
+def get_micro_batching_stats():
+    """
+    model id -> `BatchMetrics.stats()` of its micro-batcher.
+    """
+    return {model_id: batcher.metrics.stats() for model_id, batcher in micro_batchers.items()}
+
+def analyze_full(model_id, model, raw_text, keep_state=False):
+    """
+    `TextAnalysis` of `raw_text` from scratch, micro-batched with concurrent ones if enabled.
+    With `keep_state`, returns (`TextAnalysis`, `IncrementalState`).
+    """
+    if MICRO_BATCH_WINDOW_MS > 0:
+        result, state = get_micro_batcher(model_id, model).submit((raw_text, keep_state))
+    elif keep_state:
+        state = model.incremental_analyzer.analyze(raw_text)
+        result = score_analyzed(model, state.analyzed)
+    else:
+        result = analyze(model, raw_text)
+    return (result, state) if keep_state else result
+
+def _cache_text_analysis(model_id, raw_text, result):
+    nbytes = result.nbytes
+    text_analysis_cache.put((model_id, raw_text), result, nbytes)
+    # Analyzing the preprocessed text gives the same result (callbacks pass it on through dcc.Store)
+    if result.analyzed.text != raw_text:
+        text_analysis_cache.put((model_id, result.analyzed.text), result, nbytes)
+
+def get_text_analysis(model_id, model, raw_text, session_id=None):
+    """
+    `TextAnalysis` of `raw_text` with `model` (which has `analyzer`, `incremental_analyzer` and `scorer`), memoized by
+    (model_id, text). With `session_id`, a text not analyzed yet is analyzed incrementally (see `analyze_in_session`).
+    """
+    result = text_analysis_cache.get((model_id, raw_text))
+    if result is None:
+        if session_id is not None:
+            result = analyze_in_session(model_id, model, raw_text, session_id)
+        else:
+            result = analyze_full(model_id, model, raw_text)
+        _cache_text_analysis(model_id, raw_text, result)
+    return result
+
+def get_text_analyses(model_id, model, raw_texts):
+    """
+    `TextAnalysis` of each of `raw_texts`, like `get_text_analysis`, with the texts not cached analyzed in one batch.
+    """
+    results = [text_analysis_cache.get((model_id, raw_text)) for raw_text in raw_texts]
+    missing_texts = list({raw_text: None for raw_text, result in zip(raw_texts, results) if result is None})
+    if missing_texts:
+        missing_results = dict(zip(missing_texts, analyze_batch(model, missing_texts)))
+        for raw_text, result in missing_results.items():
+            _cache_text_analysis(model_id, raw_text, result)
+        results = [missing_results[raw_text] if result is None else result for raw_text, result in zip(raw_texts, results)]
+    return results
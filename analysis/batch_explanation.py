@@ -0,0 +1,120 @@
+"""
+Batch explanation engine: predictions and ranked feature contributions for many documents at once.
+
+`part1_analyze_coefficients` and `make_news_feature_highlights_bar_graph_div` explain one text at a time.
+`explain_documents` transforms a whole chunk of documents into one CSR matrix, scores it with one sparse product,
+computes every contribution as an elementwise product of the CSR values with `coef_`, and ranks them per document
+with one `lexsort` over all nonzeros. No Python loop runs over features or documents except in tokenization.
+
+Documents are processed `chunk_size` at a time, so memory stays bounded whatever the number of documents.
+"""
+import itertools
+
+import numpy as np
+
+# How contributions are ranked within a document
+RANK_BY_ABSOLUTE = 'absolute' # largest |contribution| first, e.g. binary sentiment (both signs matter)
+RANK_BY_VALUE = 'value'       # largest contribution first, e.g. towards the predicted news category
+
+
+class BatchExplanation:
+    """
+    Explanation of one chunk of `n` documents, as arrays.
+
+    probs:              (n, n_classes) predicted probabilities
+    predictions:        (n,) index (in `classes`) of the predicted class
+    target_classes:     (n,) index of the coefficient row contributions are computed for
+    top_feature_ids:    (n, top_k) feature index of the ranked contributions, -1 past the document's features
+    top_contributions:  (n, top_k) contribution (coefficient * TF-IDF value) of those features, 0 past them
+    """
+    __slots__ = ['probs', 'predictions', 'target_classes', 'top_feature_ids', 'top_contributions']
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs[name])
+
+    def __len__(self):
+        return len(self.predictions)
+
+    def records(self, classes, feature_names):
+        """
+        json-able dict per document: class probabilities, prediction and [feature, contribution] pairs.
+        """
+        classes = list(classes)
+        probs = self.probs.tolist()
+        predictions = self.predictions.tolist()
+        top_feature_ids = self.top_feature_ids.tolist()
+        top_contributions = self.top_contributions.tolist()
+        for i in range(len(predictions)):
+            yield {
+                'probabilities': dict(zip(classes, probs[i])),
+                'prediction': classes[predictions[i]],
+                'contributions': [
+                    [feature_names[feature_id], value]
+                    for feature_id, value in zip(top_feature_ids[i], top_contributions[i]) if feature_id >= 0
+                ],
+            }
+
+
+def rank_row_contributions(X, contributions, top_k, rank_by):
+    """
+    Top `top_k` (feature ids, contributions) of every row of CSR `X`, given the `contributions` of its nonzeros
+    (aligned with `X.data`). Returns two (n_rows, top_k) arrays, padded with -1 / 0.
+    """
+    n_rows = X.shape[0]
+    row_lengths = np.diff(X.indptr)
+    rows = np.repeat(np.arange(n_rows), row_lengths)
+
+    key = np.abs(contributions) if rank_by == RANK_BY_ABSOLUTE else contributions
+    # Sort by row, then by decreasing key (ties: by feature index, as they are stored)
+    order = np.lexsort((-key, rows))
+    ranks = np.arange(len(order)) - np.repeat(X.indptr[:-1], row_lengths)
+    keep = ranks < top_k
+    kept = order[keep]
+
+    top_feature_ids = np.full((n_rows, top_k), -1, dtype=np.int64)
+    top_contributions = np.zeros((n_rows, top_k))
+    top_feature_ids[rows[kept], ranks[keep]] = X.indices[kept]
+    top_contributions[rows[kept], ranks[keep]] = contributions[kept]
+    return top_feature_ids, top_contributions
+
+def explain_matrix(X, scorer, top_k=10, rank_by=RANK_BY_VALUE):
+    """
+    `BatchExplanation` of the rows of CSR TF-IDF matrix `X` (sorted indices), scored with a `LinearScorer`.
+
+    With a single coefficient row (binary), contributions are towards it (the positive class); otherwise towards each
+    document's predicted class.
+    """
+    probs = scorer.predict_proba(X)
+    predictions = probs.argmax(axis=1)
+    if scorer.coef_by_feature.shape[1] == 1:
+        target_classes = np.zeros(X.shape[0], dtype=np.int64)
+    else:
+        target_classes = predictions
+
+    row_lengths = np.diff(X.indptr)
+    contributions = X.data * scorer.coef_by_feature[X.indices, np.repeat(target_classes, row_lengths)]
+    top_feature_ids, top_contributions = rank_row_contributions(X, contributions, top_k, rank_by)
+    return BatchExplanation(
+        probs=probs,
+        predictions=predictions,
+        target_classes=target_classes,
+        top_feature_ids=top_feature_ids,
+        top_contributions=top_contributions,
+    )
+
+def iter_chunks(iterable, chunk_size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+def explain_documents(raw_documents, analyzer, scorer, top_k=10, rank_by=RANK_BY_VALUE, chunk_size=10000):
+    """
+    Yield a `BatchExplanation` per chunk of `chunk_size` documents (any iterable of raw texts, read lazily).
+    """
+    for chunk in iter_chunks(raw_documents, chunk_size):
+        X = analyzer.transform(chunk)
+        yield explain_matrix(X, scorer, top_k=top_k, rank_by=rank_by)
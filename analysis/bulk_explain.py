@@ -0,0 +1,288 @@
+"""
+Offline bulk explanation: stream a JSONL or TSV file of documents through the review or news model.
+
+    python -m analysis.bulk_explain review reviews.jsonl explanations.jsonl.gz --workers 8 --top-k 10
+    python -m analysis.bulk_explain news articles.tsv.gz explanations/ --output-format columnar
+
+Input (optionally gzipped): JSONL with the text in `--text-field` (and an id in `--id-field`), or TSV without header
+with the text in column `--text-column` (and an id in `--id-column`). Without an id, the document's position is used.
+
+Documents are explained in chunks of `--chunk-size` by a pool of `--workers` processes with the batch engine
+(`analysis/batch_explanation.py`). Only the model (analyzer & scorer) is loaded, not the corpora and tables of the UI
+sections, once in the main process before the pool forks. Output, in input order:
+- jsonl: one {"id", "prediction", "probabilities", "contributions"} object per line (gzipped if the path ends in .gz)
+- columnar: a directory with one compressed `part-NNNNN.npz` per chunk (classes, ids, probs, predictions,
+  top_features, top_contributions)
+
+After each chunk, progress is saved next to the output (`<output>.progress.json`). Running the same command again
+resumes after the last completed chunk; `--restart` starts over. An existing output without progress file is never
+overwritten without `--restart`. Throughput (docs/sec) is reported on stderr.
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import argparse
+import itertools
+import multiprocessing
+
+import numpy as np
+
+from analysis.batch_explanation import explain_documents, iter_chunks, RANK_BY_ABSOLUTE, RANK_BY_VALUE
+
+SECTIONS = {
+    'review': 'user_review',
+    'news': 'news',
+}
+# Same ranking as `explain_review_documents` / `explain_news_documents`
+RANK_BY = {
+    'review': RANK_BY_ABSOLUTE,
+    'news': RANK_BY_VALUE,
+}
+
+########################################
+# INPUT
+########################################
+
+def open_text(path, mode='rt'):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+def get_input_format(path):
+    name = path[:-len('.gz')] if path.endswith('.gz') else path
+    if name.endswith('.jsonl') or name.endswith('.json'):
+        return 'jsonl'
+    if name.endswith('.tsv') or name.endswith('.txt'):
+        return 'tsv'
+    raise ValueError(f'Cannot tell input format of {path!r}, use --input-format.')
+
+def parse_jsonl_line(line, position, text_field, id_field):
+    record = json.loads(line)
+    return record.get(id_field, position), record[text_field]
+
+def parse_tsv_line(line, position, text_column, id_column):
+    columns = line.rstrip('\n').split('\t')
+    return (columns[id_column] if id_column is not None else position), columns[text_column]
+
+def read_documents(path, input_format, skip=0, text_field='text', id_field='id', text_column=-1, id_column=None):
+    """
+    Yield (id, text) of every document of the input file, after the first `skip` ones (which are not parsed).
+    """
+    with open_text(path) as fin:
+        lines = (line for line in fin if line.strip())
+        for position, line in enumerate(itertools.islice(lines, skip, None), skip):
+            if input_format == 'jsonl':
+                yield parse_jsonl_line(line, position, text_field, id_field)
+            else:
+                yield parse_tsv_line(line, position, text_column, id_column)
+
+########################################
+# WORKERS
+########################################
+
+_worker_options = None
+_explainer = None # (analyzer, scorer, feature_names)
+
+def load_explainer(model_name):
+    """
+    (analyzer, scorer, feature_names) of a model, without anything else its UI section loads.
+    """
+    from analysis.global_vars import load_model
+    from analysis.fused_analyzer import FusedAnalyzer
+    from analysis.linear_scoring import LinearScorer
+
+    fv, clf = load_model(SECTIONS[model_name])
+    return FusedAnalyzer.from_vectorizer(fv), LinearScorer.from_classifier(clf), fv.get_feature_names()
+
+def init_worker(options):
+    """
+    Forked workers inherit the explainer loaded by the main process (see `run`), others (e.g. spawned) load it.
+    """
+    global _worker_options, _explainer
+    _worker_options = options
+    if _explainer is None:
+        _explainer = load_explainer(options['model'])
+
+def explain_chunk(chunk):
+    """
+    Explanation of [(id, text)] `chunk`, in output format: list of json lines, or dict of arrays (columnar).
+    """
+    options = _worker_options
+    analyzer, scorer, feature_names = _explainer
+
+    ids = [doc_id for doc_id, _ in chunk]
+    texts = [text for _, text in chunk]
+    batch = next(explain_documents(texts, analyzer, scorer, top_k=options['top_k'], rank_by=RANK_BY[options['model']],
+                                   chunk_size=len(texts)))
+
+    classes = scorer.classes.tolist()
+    if options['output_format'] == 'jsonl':
+        return [
+            json.dumps(dict(id=doc_id, **record))
+            for doc_id, record in zip(ids, batch.records(classes, feature_names))
+        ]
+
+    feature_ids = batch.top_feature_ids
+    top_features = np.array([[feature_names[i] if i >= 0 else '' for i in row] for row in feature_ids.tolist()])
+    return {
+        'classes': np.array(classes),
+        'ids': np.array([str(doc_id) for doc_id in ids]),
+        'probs': batch.probs,
+        'predictions': batch.predictions,
+        'top_features': top_features,
+        'top_contributions': batch.top_contributions,
+    }
+
+########################################
+# OUTPUT & PROGRESS
+########################################
+
+def progress_path(output_path):
+    return output_path.rstrip('/') + '.progress.json'
+
+def load_progress(output_path, run_config):
+    """
+    Progress of a previous run with the same `run_config`, or None.
+    """
+    path = progress_path(output_path)
+    if not os.path.isfile(path):
+        return None
+    with open(path) as fin:
+        progress = json.load(fin)
+    if progress['config'] != run_config:
+        raise ValueError(f'{path} was written by a run with different options, use --restart to start over.')
+    return progress
+
+def save_progress(output_path, progress):
+    # Write & rename, so an interruption never leaves a half-written progress file
+    path = progress_path(output_path)
+    with open(path + '.tmp', 'w') as fout:
+        json.dump(progress, fout)
+    os.replace(path + '.tmp', path)
+
+def remove_output(output_path):
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    elif os.path.exists(output_path):
+        os.remove(output_path)
+    if os.path.exists(progress_path(output_path)):
+        os.remove(progress_path(output_path))
+
+def write_jsonl_chunk(output_path, lines):
+    # Gzip output gets one member per chunk, which readers concatenate back
+    open_fn = gzip.open if output_path.endswith('.gz') else open
+    with open_fn(output_path, 'ab') as fout:
+        fout.write(''.join(line + '\n' for line in lines).encode('utf-8'))
+
+def truncate_jsonl(output_path, output_bytes):
+    """
+    Drop whatever an interrupted run wrote after its last completed chunk.
+    """
+    if os.path.exists(output_path):
+        with open(output_path, 'r+b') as fout:
+            fout.truncate(output_bytes)
+
+def write_columnar_chunk(output_path, part_index, arrays):
+    part_path = os.path.join(output_path, f'part-{part_index:05d}.npz')
+    np.savez_compressed(part_path + '.tmp.npz', **arrays)
+    os.replace(part_path + '.tmp.npz', part_path)
+
+########################################
+# MAIN
+########################################
+
+def run(args):
+    input_format = args.input_format or get_input_format(args.input)
+    run_config = {
+        'model': args.model,
+        'input': os.path.abspath(args.input),
+        'input_format': input_format,
+        'text_field': args.text_field,
+        'id_field': args.id_field,
+        'text_column': args.text_column,
+        'id_column': args.id_column,
+        'output_format': args.output_format,
+        'top_k': args.top_k,
+        'chunk_size': args.chunk_size,
+    }
+
+    if args.restart:
+        remove_output(args.output)
+    progress = load_progress(args.output, run_config)
+    if progress is None:
+        if os.path.exists(args.output):
+            raise ValueError(f'{args.output} exists but was not written by this tool, use --restart to overwrite it.')
+        progress = {'config': run_config, 'documents': 0, 'parts': 0, 'output_bytes': 0}
+        # Before any output, so that output is always resumable
+        save_progress(args.output, progress)
+
+    if args.output_format == 'jsonl':
+        truncate_jsonl(args.output, progress['output_bytes'])
+    else:
+        os.makedirs(args.output, exist_ok=True)
+    if progress['documents'] > 0:
+        print(f"Resuming after {progress['documents']} documents", file=sys.stderr)
+
+    documents = read_documents(
+        args.input, input_format, skip=progress['documents'],
+        text_field=args.text_field, id_field=args.id_field, text_column=args.text_column, id_column=args.id_column,
+    )
+    chunks = iter_chunks(documents, args.chunk_size)
+    worker_options = {'model': args.model, 'top_k': args.top_k, 'output_format': args.output_format}
+    # Before the pool forks, so that workers share it
+    init_worker(worker_options)
+
+    pool = None
+    if args.workers > 1:
+        pool = multiprocessing.Pool(args.workers, initializer=init_worker, initargs=(worker_options,))
+        results = pool.imap(explain_chunk, chunks)
+    else:
+        results = map(explain_chunk, chunks)
+
+    started_at = time.perf_counter()
+    n_documents = 0
+    try:
+        for result in results:
+            if args.output_format == 'jsonl':
+                write_jsonl_chunk(args.output, result)
+                progress['output_bytes'] = os.path.getsize(args.output)
+                n_chunk_documents = len(result)
+            else:
+                write_columnar_chunk(args.output, progress['parts'], result)
+                n_chunk_documents = len(result['ids'])
+            progress['documents'] += n_chunk_documents
+            progress['parts'] += 1
+            save_progress(args.output, progress)
+
+            n_documents += n_chunk_documents
+            seconds = time.perf_counter() - started_at
+            print(f"{progress['documents']} documents, {n_documents / seconds:.0f} docs/sec", file=sys.stderr)
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    print(f"Done: {progress['documents']} documents in {args.output}", file=sys.stderr)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m analysis.bulk_explain', description='Explain a file of documents.')
+    parser.add_argument('model', choices=sorted(SECTIONS), help='which model to run')
+    parser.add_argument('input', help='.jsonl or .tsv input file, optionally .gz')
+    parser.add_argument('output', help='output .jsonl(.gz) file, or directory for columnar output')
+    parser.add_argument('--input-format', choices=['jsonl', 'tsv'], help='default: from input file extension')
+    parser.add_argument('--output-format', choices=['jsonl', 'columnar'], default='jsonl')
+    parser.add_argument('--text-field', default='text', help='jsonl: key of the text')
+    parser.add_argument('--id-field', default='id', help='jsonl: key of the id (default to line number)')
+    parser.add_argument('--text-column', type=int, default=-1, help='tsv: column of the text')
+    parser.add_argument('--id-column', type=int, default=None, help='tsv: column of the id (default to line number)')
+    parser.add_argument('--top-k', type=int, default=10, help='contributions per document')
+    parser.add_argument('--chunk-size', type=int, default=1000, help='documents per chunk (and progress checkpoint)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of worker processes')
+    parser.add_argument('--restart', action='store_true', help='ignore previous progress, start over')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    run(parse_args(sys.argv[1:]))
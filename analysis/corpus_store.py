@@ -0,0 +1,250 @@
+"""
+Compact, columnar storage for corpus texts.
+
+A list of N python strings costs N objects (each with its own refcount, header and hash). When workers are forked
+from a preloaded master, merely reading those objects writes their refcounts, which un-shares the memory pages
+(copy-on-write). `TextColumn` keeps all texts in one contiguous utf-8 buffer plus an int64 offsets array instead,
+so the data pages are never written and stay shared between workers.
+"""
+import ast
+import tarfile
+
+import numpy as np
+
+from analysis import derived_cache
+
+# Bump when parsing of the corpus tarballs, or the stored columns, change: cached stores are then rebuilt
+STORE_VERSION = 1
+
+
+class TextColumn:
+    """
+    Read-only sequence of strings backed by a utf-8 `buffer` (uint8 array) and `offsets` (int64 array, N+1 items).
+    Text `i` is `buffer[offsets[i]:offsets[i+1]]`.
+    """
+    def __init__(self, buffer, offsets):
+        self.buffer = buffer
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [s.encode('utf-8') for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.array([len(b) for b in encoded], dtype=np.int64))
+        buffer = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+        return cls(buffer, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [self[i] for i in range(*ind.indices(len(self)))]
+        if ind < 0:
+            ind += len(self)
+        if not 0 <= ind < len(self):
+            raise IndexError('TextColumn index out of range')
+        start, end = self.offsets[ind], self.offsets[ind + 1]
+        return self.buffer[start:end].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
+
+
+class TextColumnBuilder:
+    """
+    Append-only builder of a `TextColumn` from utf-8 encoded texts, without creating python strings.
+    """
+    def __init__(self):
+        self.buffer = bytearray()
+        self.lengths = []
+
+    def append_encoded(self, encoded_text):
+        self.buffer += encoded_text
+        self.lengths.append(len(encoded_text))
+
+    def build(self):
+        offsets = np.zeros(len(self.lengths) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.array(self.lengths, dtype=np.int64))
+        return TextColumn(np.frombuffer(bytes(self.buffer), dtype=np.uint8), offsets)
+
+
+def text_columns_to_arrays(columns):
+    """
+    dict of name -> TextColumn, to flat dict of arrays (for `derived_cache.save_entry`).
+    """
+    arrays = {}
+    for name, column in columns.items():
+        arrays[f'{name}.buffer'] = column.buffer
+        arrays[f'{name}.offsets'] = column.offsets
+    return arrays
+
+def text_columns_from_arrays(arrays):
+    names = [key[:-len('.offsets')] for key in arrays if key.endswith('.offsets')]
+    return {name: TextColumn(arrays[f'{name}.buffer'], arrays[f'{name}.offsets']) for name in names}
+
+########################################
+# NEWS DATASET
+########################################
+
+# Besides ASCII whitespace, `str.strip` also removes these, `bytes.strip` does not
+_STR_ONLY_WHITESPACE_BYTES = frozenset(b'\x1c\x1d\x1e\x1f')
+
+def parse_quoted_line_reference(line):
+    """
+    What the news dataset loader originally did (`eval(line).strip()`), with `ast.literal_eval` (safe, unlike `eval`).
+    """
+    return ast.literal_eval(line.decode('utf-8')).strip().encode('utf-8')
+
+def parse_quoted_line(line):
+    """
+    Parse one line holding a python string literal (e.g. `'text'` or `"text"`), as bytes.
+    Return the utf-8 encoded, stripped string value, same as `parse_quoted_line_reference`.
+
+    Fast path works on the raw bytes directly, only for a bare literal: starts and ends with the same quote, with
+    neither that quote, a backslash, CR nor NUL in between (so no prefix, escape, triple quote or adjacent literals),
+    and no non-ASCII or non-`bytes.strip` whitespace at the edges of its value. Every other line goes to the reference.
+    """
+    stripped = line.strip(b' \t\r\n')
+    quote = stripped[:1]
+    if len(stripped) >= 2 and quote in (b"'", b'"') and stripped[-1:] == quote:
+        body = stripped[1:-1]
+        if quote not in body and b'\\' not in body and b'\r' not in body and b'\x00' not in body:
+            if not body.isascii():
+                body.decode('utf-8') # raises on invalid utf-8, as the reference does
+            body = body.strip()
+            if not body or (body[0] < 0x80 and body[-1] < 0x80
+                            and body[0] not in _STR_ONLY_WHITESPACE_BYTES and body[-1] not in _STR_ONLY_WHITESPACE_BYTES):
+                return body
+
+    return parse_quoted_line_reference(line)
+
+def read_quoted_lines(file_obj):
+    builder = TextColumnBuilder()
+    for line in file_obj:
+        builder.append_encoded(parse_quoted_line(line))
+    return builder.build()
+
+NEWS_DATASET_MEMBERS = {
+    'train_data': 'news_dataset/news_data_train.txt',
+    'train_labels': 'news_dataset/news_labels_train.txt',
+    'test_data': 'news_dataset/news_data_test.txt',
+    'test_labels': 'news_dataset/news_labels_test.txt',
+}
+
+def read_news_columns(tarfname):
+    """
+    Stream all members of the news dataset tarball into dict of name -> TextColumn.
+    """
+    columns = {}
+    with tarfile.open(tarfname, "r:gz") as tar:
+        for name, member_name in NEWS_DATASET_MEMBERS.items():
+            columns[name] = read_quoted_lines(tar.extractfile(tar.getmember(member_name)))
+    return columns
+
+def get_store_dir(tarfname):
+    return tarfname[:-len('.tar.gz')] + '.store' if tarfname.endswith('.tar.gz') else tarfname + '.store'
+
+def load_news_store(tarfname):
+    """
+    Same fields as `misc.read_news_data`, as `TextColumn`s. The decoded store is cached (memory-mapped) next to the
+    tarball, in `<tarball name>.store/`, so later boots don't decompress or parse anything.
+    """
+    arrays = derived_cache.load_or_build(
+        get_store_dir(tarfname),
+        derived_cache.versioned_key(derived_cache.content_hash([tarfname]), store=STORE_VERSION),
+        lambda: text_columns_to_arrays(read_news_columns(tarfname)),
+    )
+
+    class Data: pass
+    news = Data()
+    for name, column in text_columns_from_arrays(arrays).items():
+        setattr(news, name, column)
+    return news
+
+########################################
+# SENTIMENT DATASET
+########################################
+
+def read_sentiment_arrays(tarfname):
+    """
+    Read train.tsv & dev.tsv (label<TAB>text per line) of the sentiment tarball into flat arrays:
+    text columns, uint8 label ids and the sorted label names (like `LabelEncoder`).
+    """
+    with tarfile.open(tarfname, "r:gz") as tar:
+        member_names = {'train': 'train.tsv', 'dev': 'dev.tsv'}
+        for member in tar.getmembers():
+            for split in member_names:
+                if f'{split}.tsv' in member.name:
+                    member_names[split] = member.name
+
+        columns = {}
+        labels = {}
+        for split, member_name in member_names.items():
+            builder = TextColumnBuilder()
+            split_labels = []
+            for line in tar.extractfile(tar.getmember(member_name)):
+                (label, text) = line.decode('utf-8').strip().split('\t')
+                split_labels.append(label)
+                builder.append_encoded(text.encode('utf-8'))
+            columns[f'{split}_data'] = builder.build()
+            labels[split] = split_labels
+
+    target_labels = sorted(set(labels['train']))
+    if len(target_labels) > 255:
+        raise ValueError(f'Too many labels for uint8 label ids: {len(target_labels)}')
+    label_to_id = {label: i for i, label in enumerate(target_labels)}
+
+    arrays = text_columns_to_arrays(columns)
+    arrays.update(text_columns_to_arrays({'target_labels': TextColumn.from_strings(target_labels)}))
+    for split, split_labels in labels.items():
+        # Same as `LabelEncoder.transform`, fails on labels unseen in train
+        arrays[f'{split}y'] = np.array([label_to_id[label] for label in split_labels], dtype=np.uint8)
+    return arrays
+
+
+class SentimentStore:
+    """
+    Memory-mapped sentiment dataset, with the same fields as `misc.read_sentiment`:
+    ['train_data', 'train_labels', 'dev_data', 'dev_labels', 'le', 'target_labels', 'trainy', 'devy']
+
+    Texts are `TextColumn`s, `trainy`/`devy` are uint8 arrays. `*_labels` and `le` are derived on access.
+    """
+    def __init__(self, arrays):
+        columns = text_columns_from_arrays(arrays)
+        self.train_data = columns['train_data']
+        self.dev_data = columns['dev_data']
+        self.target_labels = np.array(list(columns['target_labels']))
+        self.trainy = arrays['trainy']
+        self.devy = arrays['devy']
+
+    @property
+    def train_labels(self):
+        return self.target_labels[self.trainy]
+
+    @property
+    def dev_labels(self):
+        return self.target_labels[self.devy]
+
+    @property
+    def le(self):
+        from sklearn import preprocessing
+        le = preprocessing.LabelEncoder()
+        le.classes_ = self.target_labels
+        return le
+
+def load_sentiment_store(tarfname):
+    """
+    Convert the sentiment tarball once into a memory-mapped store, cached in `<tarball name>.store/`.
+    """
+    arrays = derived_cache.load_or_build(
+        get_store_dir(tarfname),
+        derived_cache.versioned_key(derived_cache.content_hash([tarfname]), store=STORE_VERSION),
+        lambda: read_sentiment_arrays(tarfname),
+    )
+    return SentimentStore(arrays)
@@ -0,0 +1,121 @@
+"""
+On-disk cache for data derived from models and corpora (e.g., `trainX`, `train_pred_probs`).
+
+Each entry lives in `<cache_dir>/<key>/` as plain `.npy` files, where `key` is a content hash of every input file
+(model + corpus), plus the `VERSION` of the code that builds the entry (see `versioned_key`). When any input, or the
+way the entry is built, changes, the key changes and the entry is rebuilt automatically.
+Sparse matrices are stored as their CSR arrays (data, indices, indptr), so everything can be memory-mapped.
+"""
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+import scipy.sparse as sp
+
+CACHE_FORMAT_VERSION = 1
+MANIFEST_FILENAME = 'manifest.json'
+
+
+def _update_hash_with_file(h, path, chunk_size=1 << 20):
+    with open(path, 'rb') as fin:
+        for chunk in iter(lambda: fin.read(chunk_size), b''):
+            h.update(chunk)
+
+def content_hash(paths, extra=None):
+    """
+    sha256 over the contents of `paths` (files, or directories hashed file by file), plus any json-able `extra`.
+    """
+    h = hashlib.sha256()
+    h.update(f'cache-format-{CACHE_FORMAT_VERSION}'.encode('utf-8'))
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    file_path = os.path.join(dirpath, filename)
+                    h.update(os.path.relpath(file_path, path).encode('utf-8'))
+                    _update_hash_with_file(h, file_path)
+        else:
+            h.update(os.path.basename(path).encode('utf-8'))
+            _update_hash_with_file(h, path)
+    if extra is not None:
+        h.update(json.dumps(extra, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()[:32]
+
+def versioned_key(key, **versions):
+    """
+    Key of an entry derived from inputs hashed as `key`, by code at the given versions (e.g. `analyzer=FusedAnalyzer.VERSION`).
+    """
+    return content_hash([], extra={'key': key, 'versions': versions})
+
+
+def save_entry(entry_dir, data):
+    """
+    Save dict of name -> (numpy array | scipy sparse matrix) into `entry_dir`.
+    """
+    manifest = {}
+    for name, value in data.items():
+        if sp.issparse(value):
+            value = value.tocsr()
+            for part in ('data', 'indices', 'indptr'):
+                np.save(os.path.join(entry_dir, f'{name}.{part}.npy'), getattr(value, part))
+            manifest[name] = {'type': 'csr', 'shape': list(value.shape)}
+        else:
+            np.save(os.path.join(entry_dir, f'{name}.npy'), np.asarray(value))
+            manifest[name] = {'type': 'array'}
+    with open(os.path.join(entry_dir, MANIFEST_FILENAME), 'w') as fout:
+        json.dump(manifest, fout)
+
+def load_entry(entry_dir, mmap_mode='r'):
+    with open(os.path.join(entry_dir, MANIFEST_FILENAME)) as fin:
+        manifest = json.load(fin)
+
+    data = {}
+    for name, info in manifest.items():
+        if info['type'] == 'csr':
+            parts = [np.load(os.path.join(entry_dir, f'{name}.{part}.npy'), mmap_mode=mmap_mode) for part in ('data', 'indices', 'indptr')]
+            # Construct without copying/validating, so arrays stay memory-mapped
+            X = sp.csr_matrix(tuple(info['shape']), dtype=parts[0].dtype)
+            X.data, X.indices, X.indptr = parts
+            data[name] = X
+        else:
+            data[name] = np.load(os.path.join(entry_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+    return data
+
+
+def load_or_build(cache_dir, key, build_fn, mmap_mode='r'):
+    """
+    Return cached entry for `key`, or call `build_fn()` (-> dict of arrays), persist its result and return it.
+    Stale entries (other keys) are removed once the new entry is written.
+    """
+    entry_dir = os.path.join(cache_dir, key)
+    if os.path.isfile(os.path.join(entry_dir, MANIFEST_FILENAME)):
+        try:
+            data = load_entry(entry_dir, mmap_mode=mmap_mode)
+            print("Loaded cache: ", entry_dir)
+            return data
+        except (OSError, ValueError, KeyError) as error:
+            print("Invalid cache:", entry_dir, error, "...Rebuild")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    data = build_fn()
+
+    # Write to temp dir and rename, so concurrent workers never see a partially written entry
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=f'.{key}.', dir=cache_dir)
+    try:
+        save_entry(tmp_dir, data)
+        os.rename(tmp_dir, entry_dir)
+        print("Saved cache: ", entry_dir)
+    except OSError:
+        # Another process already wrote the same key
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for name in os.listdir(cache_dir):
+        if name != key and not name.startswith('.'):
+            shutil.rmtree(os.path.join(cache_dir, name), ignore_errors=True)
+
+    return load_entry(entry_dir, mmap_mode=mmap_mode) if os.path.isdir(entry_dir) else data
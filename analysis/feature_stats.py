@@ -0,0 +1,113 @@
+"""
+Per-feature statistics over the training set, for every vocabulary entry, computed in one vectorized pass.
+
+Answers "how often / in which context does this feature appear" in constant time, instead of recounting from
+`trainX` and `trainy` on every click, and allows ranking the whole vocabulary by any statistic.
+"""
+import numpy as np
+
+POSITIVE_LABEL = 1
+
+# sort key (a `FeatureStatsTable` attribute) -> label shown in UI
+SORT_KEYS = {
+    'document_frequency': 'Document frequency',
+    'positive_count': 'Positive count',
+    'negative_count': 'Negative count',
+    'mean_pred_prob': 'Mean predicted probability',
+    'mean_contribution': 'Mean contribution',
+}
+
+
+class FeatureStatsTable:
+    """
+    Columns (one entry per feature):
+
+    document_frequency: number of training documents containing the feature
+    positive_count:     ... of which are labeled positive
+    negative_count:     ... of which are labeled negative
+    mean_pred_prob:     mean predicted positive probability of those documents
+    mean_contribution:  mean contribution (coefficient * TF-IDF) of the feature in those documents
+
+    Means are 0 for features that don't appear in the training set.
+    """
+    # Version of `build` / `to_arrays`, part of the on-disk cache key
+    VERSION = 1
+
+    COLUMNS = ['document_frequency', 'positive_count', 'negative_count', 'mean_pred_prob', 'mean_contribution']
+
+    def __init__(self, n_documents, **columns):
+        self.n_documents = int(n_documents)
+        for name in self.COLUMNS:
+            setattr(self, name, columns[name])
+
+    @classmethod
+    def build(cls, X, y, pred_probs, coefficients):
+        """
+        `X`: (n_documents, n_features) CSR TF-IDF matrix, `y`: binary labels, `pred_probs`: (n_documents, 2),
+        `coefficients`: (n_features,) coefficients of the positive class.
+        """
+        n_documents, n_features = X.shape
+        nonzero = X.data != 0
+        feature_ids = X.indices[nonzero]
+        doc_ids = np.repeat(np.arange(n_documents), np.diff(X.indptr))[nonzero]
+        values = X.data[nonzero]
+
+        def sum_per_feature(weights=None):
+            return np.bincount(feature_ids, weights=weights, minlength=n_features)
+
+        document_frequency = sum_per_feature().astype(np.int64)
+        positive_count = np.round(sum_per_feature((np.asarray(y)[doc_ids] == POSITIVE_LABEL).astype(np.float64))).astype(np.int64)
+        pred_prob_sum = sum_per_feature(np.asarray(pred_probs)[doc_ids, 1])
+        contribution_sum = sum_per_feature(values * np.asarray(coefficients)[feature_ids])
+
+        denominator = np.maximum(document_frequency, 1)
+        return cls(
+            n_documents,
+            document_frequency=document_frequency,
+            positive_count=positive_count,
+            negative_count=document_frequency - positive_count,
+            mean_pred_prob=pred_prob_sum / denominator,
+            mean_contribution=contribution_sum / denominator,
+        )
+
+    def __len__(self):
+        return len(self.document_frequency)
+
+    def get(self, feature_id):
+        """
+        Stats of one feature, as dict of python numbers.
+        """
+        return {name: getattr(self, name)[feature_id].item() for name in self.COLUMNS}
+
+    def top_features(self, sort_key, n, descending=True, min_document_frequency=1):
+        """
+        Feature ids of the `n` features with highest (or lowest) `sort_key`, among those appearing in at least
+        `min_document_frequency` documents. Ties are broken by feature id.
+        """
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f'Invalid sort key: {sort_key!r}')
+
+        candidates = np.flatnonzero(self.document_frequency >= min_document_frequency)
+        values = np.asarray(getattr(self, sort_key), dtype=np.float64)[candidates]
+        if descending:
+            values = -values
+
+        # Partial selection first, so only `n` items get fully sorted
+        if n < len(candidates):
+            threshold = np.partition(values, n - 1)[n - 1]
+            selected = values <= threshold
+            candidates, values = candidates[selected], values[selected]
+        order = np.lexsort((candidates, values))[:n]
+        return candidates[order]
+
+    def to_arrays(self):
+        """
+        For `derived_cache`.
+        """
+        arrays = {name: getattr(self, name) for name in self.COLUMNS}
+        arrays['n_documents'] = np.array(self.n_documents)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(int(arrays['n_documents']), **{name: arrays[name] for name in cls.COLUMNS})
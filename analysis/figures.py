@@ -0,0 +1,75 @@
+"""
+Lightweight figure building: figures as plain json-ready dicts, the same as what `go.Figure(...).to_plotly_json()`
+produces with the pinned plotly (3.7, e.g. `title={'text': ...}`, template traces with their `type`), without plotly's
+`graph_objs` validating every property on every call. `benchmarks/bench_figure_builder.py` checks it.
+
+Layouts come from templates built once at import. `layout(...)` returns a shallow copy with the given overrides, so
+nested dicts are shared between figures: treat returned figures as read-only.
+
+Trace attributes that are the same for every segment of a stacked bar chart live in the layout's plotly template
+(`layout.template.data.bar`, plotly.js >= 1.42, dash-core-components 0.47 bundles 1.47), so each segment only carries
+what differs. Segments stay separate traces, since each one is an entry of the legend.
+"""
+
+LAYOUT_TEMPLATES = {
+    'feature_contribution': {
+        'yaxis': {'autorange': 'reversed', 'automargin': True},
+        'xaxis': {'automargin': True},
+    },
+    'feature_strengths': {
+        'yaxis': {'automargin': True, 'fixedrange': True},
+        'xaxis': {'automargin': True, 'fixedrange': True},
+    },
+    'information_value': {
+        'yaxis': {'title': {'text': 'IV'}, 'automargin': True, 'fixedrange': True},
+        'xaxis': {'automargin': True, 'fixedrange': True},
+    },
+    'pie': {},
+    'stacked_bars': {
+        'barmode': 'stack',
+        'template': {
+            'data': {
+                'bar': [{'type': 'bar', 'textposition': 'auto', 'marker': {'line': {'width': 1}}}],
+            },
+        },
+    },
+}
+
+
+def _trace(trace_type, props):
+    trace = {'type': trace_type}
+    for name, value in props.items():
+        if value is not None:
+            trace[name] = value
+    return trace
+
+def bar(**props):
+    return _trace('bar', props)
+
+def pie(**props):
+    return _trace('pie', props)
+
+def layout(template_name, title=None, **overrides):
+    result = dict(LAYOUT_TEMPLATES[template_name])
+    if title is not None:
+        result['title'] = {'text': title}
+    result.update(overrides)
+    return result
+
+def figure(data, layout):
+    return {'data': data, 'layout': layout}
+
+def stacked_bar_segment(x, name, value, show_text, marker_color, line_color):
+    """
+    One segment of a bar stacked on category `x`, for a figure with the 'stacked_bars' layout.
+    """
+    segment = {
+        'type': 'bar',
+        'x': [x],
+        'y': [value],
+        'name': name,
+        'marker': {'color': marker_color, 'line': {'color': line_color}},
+    }
+    if show_text:
+        segment['text'] = name
+    return segment
@@ -0,0 +1,273 @@
+"""
+Fused text analyzer: raw text -> tokens, char offsets, n-gram feature ids and TF-IDF row, in a single pass.
+
+Before, one input went through `fv_text_preprocessor` + `fv_text_tokenize` (to show the tokens), then `fv.transform`
+ran the preprocessor, tokenizer and n-gram generation again, and the explanation rebuilt the tokenizer once more.
+`FusedAnalyzer` is built once per model and reproduces `TfidfVectorizer` (word analyzer) exactly, while keeping
+the intermediate results around in an `AnalyzedText` that all callbacks can share.
+"""
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+from analysis.text_preprocessor import TextPreprocessor
+
+########################################
+# ANALYZER CONFIG
+########################################
+
+def get_preprocessor_config(fv):
+    """
+    Describe `fv.preprocessor` in a json-able way. Only the preprocessors used in this project are supported.
+    """
+    preprocessor = fv.preprocessor
+    if preprocessor is None:
+        return {'type': 'default'}
+
+    owner = getattr(preprocessor, '__self__', None)
+    if isinstance(owner, TextPreprocessor) and preprocessor.__name__ == 'preprocess':
+        return {'type': 'text_preprocessor', 'expand_apostrophe': owner.expand_apostrophe}
+
+    raise ValueError(f'Unsupported preprocessor: {preprocessor!r}')
+
+def get_analyzer_config(fv):
+    """
+    json-able config of a fitted `TfidfVectorizer`, everything needed to reproduce its analyzer & TF-IDF weighting.
+    """
+    if fv.analyzer != 'word':
+        raise ValueError(f"Only 'word' analyzer is supported, got: {fv.analyzer!r}")
+    if fv.tokenizer is not None:
+        raise ValueError(f'Custom tokenizer is not supported, got: {fv.tokenizer!r}')
+
+    stop_words = fv.get_stop_words()
+    return {
+        'preprocessor': get_preprocessor_config(fv),
+        'lowercase': fv.lowercase,
+        'strip_accents': fv.strip_accents,
+        'token_pattern': fv.token_pattern,
+        'ngram_range': list(fv.ngram_range),
+        'stop_words': sorted(stop_words) if stop_words is not None else None,
+        'binary': fv.binary,
+        'norm': fv.norm,
+        'use_idf': fv.use_idf,
+        'smooth_idf': fv.smooth_idf,
+        'sublinear_tf': fv.sublinear_tf,
+    }
+
+def build_preprocessor_from_config(analyzer_config):
+    preprocessor_config = analyzer_config['preprocessor']
+    if preprocessor_config['type'] == 'text_preprocessor':
+        return TextPreprocessor(expand_apostrophe=preprocessor_config['expand_apostrophe']).preprocess
+
+    strip_accents = analyzer_config['strip_accents']
+    strip = None
+    if strip_accents == 'ascii':
+        from sklearn.feature_extraction.text import strip_accents_ascii as strip
+    elif strip_accents == 'unicode':
+        from sklearn.feature_extraction.text import strip_accents_unicode as strip
+    elif strip_accents is not None:
+        raise ValueError(f'Invalid strip_accents: {strip_accents!r}')
+
+    if analyzer_config['lowercase']:
+        if strip is None:
+            return lambda doc: doc.lower()
+        return lambda doc: strip(doc.lower())
+    if strip is None:
+        return lambda doc: doc
+    return strip
+
+########################################
+# TF-IDF
+########################################
+
+def _row_sums(values, indptr):
+    sums = np.zeros(len(indptr) - 1)
+    nonempty = np.diff(indptr) > 0
+    if nonempty.any():
+        sums[nonempty] = np.add.reduceat(values, indptr[:-1][nonempty])
+    return sums
+
+def apply_tfidf(X, analyzer_config, idf):
+    """
+    Turn CSR term counts `X` into TF-IDF values in place, like `TfidfTransformer.transform`.
+    """
+    if analyzer_config['binary']:
+        X.data.fill(1)
+    if analyzer_config['sublinear_tf']:
+        np.log(X.data, X.data)
+        X.data += 1
+    if analyzer_config['use_idf']:
+        X.data *= np.asarray(idf)[X.indices]
+
+    norm = analyzer_config['norm']
+    if norm == 'l2':
+        row_norms = np.sqrt(_row_sums(X.data ** 2, X.indptr))
+    elif norm == 'l1':
+        row_norms = _row_sums(np.abs(X.data), X.indptr)
+    elif norm is not None:
+        raise ValueError(f'Invalid norm: {norm!r}')
+    if norm is not None:
+        row_norms[row_norms == 0] = 1
+        X.data /= np.repeat(row_norms, np.diff(X.indptr))
+    return X
+
+########################################
+# ANALYZER
+########################################
+
+class AnalyzedText:
+    """
+    Everything derived from one input text. Offsets refer to `text` (tokens joined by single spaces).
+
+    text:                 preprocessed text, same as `preprocess(raw_text)`
+    tokens:               list of tokens
+    token_starts:         char offset of each token in `text`
+    token_ends:           char offset (exclusive) of each token in `text`
+    feature_ids:          feature index of each n-gram occurrence found in vocabulary
+    feature_token_starts: index (in `tokens`) of the first token of each occurrence
+    feature_token_ends:   index (in `tokens`, exclusive) after the last token of each occurrence
+    x:                    (1, n_features) CSR TF-IDF row, sorted indices
+    """
+    __slots__ = ['text', 'tokens', 'token_starts', 'token_ends', 'feature_ids', 'feature_token_starts', 'feature_token_ends', 'x']
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs[name])
+
+    @property
+    def feature_char_spans(self):
+        """
+        (start, end) char offsets in `text` of each n-gram occurrence, as two int arrays.
+        """
+        return self.token_starts[self.feature_token_starts], self.token_ends[self.feature_token_ends - 1]
+
+
+class FusedAnalyzer:
+    """
+    Equivalent of a fitted `TfidfVectorizer` (word analyzer), see module docstring.
+
+    `vocabulary`: dict-like term -> feature index (`dict`, or `model_artifacts.Vocabulary`)
+    """
+    # Bump when analysis results change (e.g. tokenization), matrices cached by `derived_cache` are then rebuilt
+    VERSION = 1
+
+    def __init__(self, analyzer_config, vocabulary, idf):
+        self.config = analyzer_config
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.n_features = len(idf)
+
+        self.preprocess = build_preprocessor_from_config(analyzer_config)
+        self.token_pattern = re.compile(analyzer_config['token_pattern'])
+        self.tokenize = self.token_pattern.findall
+        self.min_n, self.max_n = analyzer_config['ngram_range']
+        stop_words = analyzer_config['stop_words']
+        self.stop_words = frozenset(stop_words) if stop_words is not None else None
+
+    @classmethod
+    def from_vectorizer(cls, fv):
+        """
+        Build from a fitted sklearn `TfidfVectorizer`, or a `model_artifacts.ArtifactVectorizer`.
+        """
+        analyzer = getattr(fv, 'analyzer_', None)
+        if isinstance(analyzer, FusedAnalyzer):
+            return analyzer
+        return cls(get_analyzer_config(fv), fv.vocabulary_, np.asarray(fv.idf_))
+
+    def lookup(self, terms):
+        """
+        Feature indices of `terms` (int array, -1 for terms not in vocabulary).
+        """
+        if hasattr(self.vocabulary, 'lookup_many'):
+            return self.vocabulary.lookup_many(terms)
+        get = self.vocabulary.get
+        return np.array([get(t, -1) for t in terms], dtype=np.int64)
+
+    def _ngram_positions(self, n_tokens):
+        """
+        (start, n) of every n-gram over `n_tokens` tokens, in the same order as sklearn's `_word_ngrams`.
+        """
+        positions = []
+        for n in range(self.min_n, min(self.max_n, n_tokens) + 1):
+            positions += [(i, n) for i in range(n_tokens - n + 1)]
+        return positions
+
+    def analyze_tokens(self, tokens):
+        """
+        n-gram terms of `tokens` (after stop words removal), same as sklearn's `_word_ngrams`.
+        """
+        if self.stop_words is not None:
+            tokens = [w for w in tokens if w not in self.stop_words]
+        if self.max_n == 1:
+            return tokens if self.min_n == 1 else []
+        space_join = ' '.join
+        return [space_join(tokens[i: i + n]) for i, n in self._ngram_positions(len(tokens))]
+
+    def analyze(self, raw_text):
+        """
+        Analyze one raw input text into an `AnalyzedText`.
+        """
+        tokens = self.tokenize(self.preprocess(raw_text))
+        text = ' '.join(tokens)
+
+        token_lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+        token_starts = np.zeros(len(tokens), dtype=np.int64)
+        if len(tokens) > 1:
+            token_starts[1:] = np.cumsum(token_lengths[:-1] + 1)
+        token_ends = token_starts + token_lengths
+
+        # n-grams are built over the tokens that are not stop words; remember where those are
+        if self.stop_words is not None:
+            kept_positions = [i for i, w in enumerate(tokens) if w not in self.stop_words]
+            kept_tokens = [tokens[i] for i in kept_positions]
+        else:
+            kept_positions = range(len(tokens))
+            kept_tokens = tokens
+
+        space_join = ' '.join
+        positions = self._ngram_positions(len(kept_tokens))
+        terms = [space_join(kept_tokens[i: i + n]) for i, n in positions]
+        term_ids = self.lookup(terms)
+
+        found = term_ids >= 0
+        kept_positions = np.asarray(kept_positions, dtype=np.int64)
+        ngram_starts = np.array([i for i, _ in positions], dtype=np.int64).reshape(-1)
+        ngram_lengths = np.array([n for _, n in positions], dtype=np.int64).reshape(-1)
+        feature_ids = term_ids[found]
+        feature_token_starts = kept_positions[ngram_starts[found]]
+        feature_token_ends = kept_positions[ngram_starts[found] + ngram_lengths[found] - 1] + 1
+
+        return AnalyzedText(
+            text=text,
+            tokens=tokens,
+            token_starts=token_starts,
+            token_ends=token_ends,
+            feature_ids=feature_ids,
+            feature_token_starts=feature_token_starts,
+            feature_token_ends=feature_token_ends,
+            x=self._tfidf_rows([feature_ids]),
+        )
+
+    def _tfidf_rows(self, feature_ids_per_row):
+        indptr = np.zeros(len(feature_ids_per_row) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(ids) for ids in feature_ids_per_row])
+        indices = np.concatenate(feature_ids_per_row) if len(feature_ids_per_row) else np.empty(0, dtype=np.int64)
+        X = sp.csr_matrix(
+            (np.ones(len(indices), dtype=np.float64), indices, indptr),
+            shape=(len(feature_ids_per_row), self.n_features))
+        X.sum_duplicates() # merges repeated terms into counts, and sorts indices
+        return apply_tfidf(X, self.config, self.idf)
+
+    def transform(self, raw_documents):
+        """
+        Same as `TfidfVectorizer.transform`: CSR TF-IDF matrix of `raw_documents`.
+        """
+        if isinstance(raw_documents, str):
+            raise ValueError("Iterable over raw text documents expected, string object received.")
+
+        feature_ids_per_row = []
+        for doc in raw_documents:
+            term_ids = self.lookup(self.analyze_tokens(self.tokenize(self.preprocess(doc))))
+            feature_ids_per_row.append(term_ids[term_ids >= 0])
+        return self._tfidf_rows(feature_ids_per_row)
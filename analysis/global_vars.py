@@ -1,6 +1,19 @@
 
 import os
-from analysis.misc import renamed_load, read_sentiment, read_news_data, rgba
+import gc
+import functools
+import threading
+
+from analysis.misc import renamed_load, rgba
+from analysis.model_artifacts import artifacts_exist, load_model_artifacts
+from analysis.linear_scoring import LinearScorer
+from analysis.fused_analyzer import FusedAnalyzer
+from analysis.incremental_analyzer import IncrementalAnalyzer
+from analysis.postings_index import PostingsIndex
+from analysis.feature_stats import FeatureStatsTable
+from analysis.information_value import InformationValueTable
+from analysis import derived_cache
+from analysis.corpus_store import load_news_store, load_sentiment_store
 
 from sklearn.feature_extraction.text import TfidfVectorizer
 
@@ -29,13 +42,17 @@ class UI_STYLES:
 class UserReviewGlobalModel:
     fv = None
     clf = None
+    scorer = None
 
     sentiment = None
     trainX = None
     train_pred_probs = None
+    postings_index = None
+    feature_stats = None
+    information_values = None
 
-    fv_text_preprocessor = None
-    fv_text_tokenize = None
+    analyzer = None
+    incremental_analyzer = None
 
     feature_names = None
     feature_names_set = None
@@ -46,45 +63,119 @@ class UserReviewGlobalModel:
 class NewsClassificationGlobalModel:
     fv = None
     clf = None
+    scorer = None
+    analyzer = None
+    incremental_analyzer = None
 
     feature_names_set = None
 
     news = None
     category_to_colors = None
+    class_to_index = None
+
+    information_values = None # Built on first use, see `get_news_information_values`
 
 user_review_model = UserReviewGlobalModel()
 news_model = NewsClassificationGlobalModel()
 
+# section -> (fv pickle, clf pickle, flat artifact dir), relative to project root.
+# See `analysis/model_artifacts.py` to export the pickles into artifact dir.
+MODEL_FILES = {
+    'user_review': ('assets/model_user_review/fv.pkl', 'assets/model_user_review/clf.pkl', 'assets/model_user_review/artifacts'),
+    'news': ('assets/model_news/fv_news.pkl', 'assets/model_news/clf_news.pkl', 'assets/model_news/artifacts'),
+}
+
 def load_pickle(name):
     with open(name, 'rb') as fin:
         data = renamed_load(fin)
         print("Loaded: ", name)
         return data
 
+def get_model_paths(section):
+    """
+    Files the model of `section` is loaded from: [artifact_dir] if exported, otherwise [fv pickle, clf pickle].
+    """
+    root_dir = os.getcwd()
+    fv_path, clf_path, artifact_dir = [os.path.join(root_dir, p) for p in MODEL_FILES[section]]
+    if artifacts_exist(artifact_dir):
+        return [artifact_dir]
+    return [fv_path, clf_path]
+
+def load_model(section):
+    """
+    Load (fv, clf) of a section, prefer memory-mapped artifacts over pickles if they were exported.
+    """
+    model_paths = get_model_paths(section)
+    if len(model_paths) == 1:
+        return load_model_artifacts(model_paths[0])
+    return tuple(load_pickle(path) for path in model_paths)
+
+def get_feature_names_set(fv, feature_names):
+    # Artifact vocabulary already supports fast `in`, no need to copy all names into a set
+    if isinstance(feature_names, list):
+        return set(feature_names)
+    return fv.vocabulary_
+
+
+def get_incremental_analyzer(analyzer):
+    # Only for analyzers whose tokens can't span words, otherwise every text is analyzed from scratch
+    if IncrementalAnalyzer.supports(analyzer):
+        return IncrementalAnalyzer(analyzer)
+    return None
+
 
 def initialize_global_vars_for_user_review_section():
     root_dir = os.getcwd()
 
-    fv = load_pickle(os.path.join(root_dir, 'assets/model_user_review/fv.pkl'))
-    clf = load_pickle(os.path.join(root_dir, 'assets/model_user_review/clf.pkl'))
+    fv, clf = load_model('user_review')
 
-    fv_text_preprocessor = fv.build_preprocessor()
-    fv_text_tokenize = fv.build_tokenizer()
+    analyzer = FusedAnalyzer.from_vectorizer(fv)
 
     feature_names = fv.get_feature_names()
-    feature_names_set = set(feature_names)
+    feature_names_set = get_feature_names_set(fv, feature_names)
     clf_coefficients = clf.coef_[0] # 1d array
     clf_intercept = clf.intercept_[0] # scalar
+    scorer = LinearScorer.from_classifier(clf)
 
-    sentiment = read_sentiment(os.path.join(root_dir, 'assets/model_user_review/sentiment.tar.gz'))
-    trainX = fv.transform(sentiment.train_data)
-    train_pred_probs = clf.predict_proba(trainX)
+    sentiment_path = os.path.join(root_dir, 'assets/model_user_review/sentiment.tar.gz')
+    sentiment = load_sentiment_store(sentiment_path)
 
+    # trainX & its predictions only change when model or corpus change, so reuse them across restarts
+    def build_training_data():
+        trainX = analyzer.transform(sentiment.train_data)
+        return {'trainX': trainX, 'train_pred_probs': scorer.predict_proba(trainX)}
+
+    inputs_key = derived_cache.content_hash(get_model_paths('user_review') + [sentiment_path])
+    training_data_key = derived_cache.versioned_key(inputs_key, analyzer=FusedAnalyzer.VERSION, scorer=LinearScorer.VERSION)
+    training_data = derived_cache.load_or_build(
+        os.path.join(root_dir, 'assets/model_user_review/cache/training_data'),
+        training_data_key,
+        build_training_data,
+    )
+    trainX = training_data['trainX']
+    train_pred_probs = training_data['train_pred_probs']
+
+    postings_index = PostingsIndex.from_arrays(derived_cache.load_or_build(
+        os.path.join(root_dir, 'assets/model_user_review/cache/postings_index'),
+        derived_cache.versioned_key(training_data_key, postings_index=PostingsIndex.VERSION),
+        lambda: PostingsIndex.build(trainX, sentiment.trainy).to_arrays(),
+    ))
+    feature_stats = FeatureStatsTable.from_arrays(derived_cache.load_or_build(
+        os.path.join(root_dir, 'assets/model_user_review/cache/feature_stats'),
+        derived_cache.versioned_key(training_data_key, feature_stats=FeatureStatsTable.VERSION),
+        lambda: FeatureStatsTable.build(trainX, sentiment.trainy, train_pred_probs, clf_coefficients).to_arrays(),
+    ))
+    information_values = InformationValueTable.from_arrays(derived_cache.load_or_build(
+        os.path.join(root_dir, 'assets/model_user_review/cache/information_values'),
+        derived_cache.versioned_key(training_data_key, information_values=InformationValueTable.VERSION),
+        lambda: InformationValueTable.build(trainX, sentiment.trainy, len(clf.classes_)).to_arrays(),
+    ))
 
     user_review_model.fv = fv
     user_review_model.clf = clf
-    user_review_model.fv_text_preprocessor = fv_text_preprocessor
-    user_review_model.fv_text_tokenize = fv_text_tokenize
+    user_review_model.scorer = scorer
+    user_review_model.analyzer = analyzer
+    user_review_model.incremental_analyzer = get_incremental_analyzer(analyzer)
     user_review_model.feature_names = feature_names
     user_review_model.feature_names_set = feature_names_set
     user_review_model.clf_coefficients = clf_coefficients
@@ -92,25 +183,162 @@ def initialize_global_vars_for_user_review_section():
     user_review_model.sentiment = sentiment
     user_review_model.trainX = trainX
     user_review_model.train_pred_probs = train_pred_probs
+    user_review_model.postings_index = postings_index
+    user_review_model.feature_stats = feature_stats
+    user_review_model.information_values = information_values
 
 def initialize_global_vars_for_news_section():
     root_dir = os.getcwd()
 
-    fv = load_pickle(os.path.join(root_dir, 'assets/model_news/fv_news.pkl'))
-    clf = load_pickle(os.path.join(root_dir, 'assets/model_news/clf_news.pkl'))
-    news_data = read_news_data(os.path.join(root_dir, 'assets/model_news/news_dataset.tar.gz'))
-    fv_text_preprocessor = fv.build_preprocessor()
-    fv_text_tokenize = fv.build_tokenizer()
+    fv, clf = load_model('news')
+    news_data = load_news_store(os.path.join(root_dir, 'assets/model_news/news_dataset.tar.gz'))
+    analyzer = FusedAnalyzer.from_vectorizer(fv)
     feature_names = fv.get_feature_names()
-    feature_names_set = set(feature_names)
+    feature_names_set = get_feature_names_set(fv, feature_names)
 
     category_to_colors = {c: color for c, color in zip(clf.classes_, UI_STYLES.TEN_COLOR_PALETTE_FOR_GRAPH)}
     
     news_model.fv = fv
     news_model.clf = clf
+    news_model.scorer = LinearScorer.from_classifier(clf)
     news_model.feature_names = feature_names
     news_model.feature_names_set = feature_names_set
     news_model.news_data = news_data
-    news_model.fv_text_preprocessor = fv_text_preprocessor
-    news_model.fv_text_tokenize = fv_text_tokenize
+    news_model.analyzer = analyzer
+    news_model.incremental_analyzer = get_incremental_analyzer(analyzer)
     news_model.category_to_colors = category_to_colors
+    news_model.class_to_index = {c: i for i, c in enumerate(clf.classes_)}
+
+_news_information_values_lock = threading.Lock()
+
+def get_news_information_values():
+    """
+    One-vs-rest `InformationValueTable` of the news model (class index = index in `clf.classes_`).
+
+    Needs the whole news training set transformed, so it is only built when first asked for (then cached on disk).
+    """
+    ensure_section_loaded('news')
+    if news_model.information_values is not None:
+        return news_model.information_values
+
+    with _news_information_values_lock:
+        if news_model.information_values is None:
+            root_dir = os.getcwd()
+            news_path = os.path.join(root_dir, 'assets/model_news/news_dataset.tar.gz')
+
+            def build_information_values():
+                class_to_index = news_model.class_to_index
+                labels = [class_to_index[label] for label in news_model.news_data.train_labels]
+                trainX = news_model.analyzer.transform(news_model.news_data.train_data)
+                return InformationValueTable.build(trainX, labels, len(class_to_index)).to_arrays()
+
+            news_model.information_values = InformationValueTable.from_arrays(derived_cache.load_or_build(
+                os.path.join(root_dir, 'assets/model_news/cache/information_values'),
+                derived_cache.versioned_key(
+                    derived_cache.content_hash(get_model_paths('news') + [news_path]),
+                    analyzer=FusedAnalyzer.VERSION,
+                    information_values=InformationValueTable.VERSION,
+                ),
+                build_information_values,
+            ))
+    return news_model.information_values
+
+
+class ModelSection:
+    """
+    A lazily initialized section of global model state (e.g. `user_review_model`).
+    Loaded on first use, at most once per process, optionally in a background thread.
+    """
+    def __init__(self, name, model, initialize_fn):
+        self.name = name
+        self.model = model
+        self.initialize_fn = initialize_fn
+
+        self.is_loaded = False
+        self.error = None
+        self._lock = threading.Lock()
+        self._background_thread = None
+
+    @property
+    def is_loading(self):
+        return self._lock.locked()
+
+    def ensure_loaded(self):
+        """
+        Block until the section is loaded (initializing it in the calling thread if needed).
+        """
+        if self.is_loaded:
+            return self.model
+
+        with self._lock:
+            if not self.is_loaded:
+                print(f"Initializing section: {self.name}")
+                try:
+                    self.initialize_fn()
+                except Exception as error:
+                    self.error = error
+                    raise
+                self.error = None
+                self.is_loaded = True
+
+        if BACKGROUND_WARMUP:
+            warmup_sections_in_background()
+        return self.model
+
+    def load_in_background(self):
+        if self.is_loaded or (self._background_thread is not None and self._background_thread.is_alive()):
+            return
+
+        def load():
+            try:
+                self.ensure_loaded()
+            except Exception as error:
+                print(f"Error initializing section {self.name}:", error)
+
+        self._background_thread = threading.Thread(target=load, name=f'load-{self.name}', daemon=True)
+        self._background_thread.start()
+
+
+# When a section is loaded on demand, also warm the other sections in background thread.
+# Off by default, so a worker only pays for the sections it actually serves.
+BACKGROUND_WARMUP = os.environ.get('MODEL_BACKGROUND_WARMUP', '0') == '1'
+
+sections = {
+    'user_review': ModelSection('user_review', user_review_model, initialize_global_vars_for_user_review_section),
+    'news': ModelSection('news', news_model, initialize_global_vars_for_news_section),
+}
+
+def ensure_section_loaded(name):
+    return sections[name].ensure_loaded()
+
+def warmup_sections_in_background():
+    for section in sections.values():
+        section.load_in_background()
+
+def preload_all_sections():
+    """
+    Load every section in the current (master) process, before gunicorn forks workers (`--preload`).
+
+    Afterwards, all objects alive so far are moved out of the garbage collector's generations (`gc.freeze`),
+    so GC passes in the workers don't write to them and their memory pages stay shared copy-on-write.
+    """
+    for section in sections.values():
+        section.ensure_loaded()
+
+    gc.collect()
+    if hasattr(gc, 'freeze'): # python >= 3.7
+        gc.freeze()
+
+def requires_section(name):
+    """
+    Decorator for functions that use a section's global model, loads the section on first call.
+    """
+    section = sections[name]
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not section.is_loaded:
+                section.ensure_loaded()
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,286 @@
+"""
+Incremental text analysis: re-analyze an edited text from the analysis of its previous version.
+
+Each keystroke in the input text areas used to re-run preprocessing, tokenization, n-gram lookup and TF-IDF over the
+whole document. `IncrementalAnalyzer.update` diffs the new raw text against the previous one, re-tokenizes only the
+edited window (expanded to whitespace boundaries), recomputes only the n-grams that overlap it, updates the term
+counts, and renormalizes the TF-IDF row. The result is the same `AnalyzedText` as `FusedAnalyzer.analyze`.
+
+Python-level work is proportional to the size of the edit. Splicing the token & n-gram arrays of the untouched parts
+is still linear in the document, but as C-level copies.
+
+This relies on tokens never spanning whitespace of the raw text: true for the preprocessors of this project (they
+work word by word) with sklearn's default `token_pattern`. Other analyzers are not supported, see `supports`.
+"""
+import re
+import sys
+
+import numpy as np
+import scipy.sparse as sp
+
+from analysis.fused_analyzer import AnalyzedText, apply_tfidf
+
+# Token patterns that can't match whitespace (sklearn's default)
+LOCAL_TOKEN_PATTERNS = {r"(?u)\b\w\w+\b"}
+
+_EMPTY = np.empty(0, dtype=np.int64)
+_raw_words = re.compile(r'\S+')
+_BLOCK = 4096
+
+def _common_prefix_length(a, b):
+    # Compare whole blocks (in C) first, then binary search within the first differing block
+    max_length = min(len(a), len(b))
+    low = 0
+    while low + _BLOCK <= max_length and a[low: low + _BLOCK] == b[low: low + _BLOCK]:
+        low += _BLOCK
+    high = min(low + _BLOCK, max_length)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low: mid] == b[low: mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def _common_suffix_length(a, b, max_length):
+    """
+    Same as `_common_prefix_length` from the ends, up to `max_length`.
+    """
+    len_a, len_b = len(a), len(b)
+    low = 0
+    while low + _BLOCK <= max_length and a[len_a - low - _BLOCK: len_a - low] == b[len_b - low - _BLOCK: len_b - low]:
+        low += _BLOCK
+    high = min(low + _BLOCK, max_length)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len_a - mid: len_a - low] == b[len_b - mid: len_b - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+class IncrementalState:
+    """
+    Analysis of one raw text, with what `IncrementalAnalyzer.update` needs to analyze its next version.
+
+    raw_text:           the raw input text
+    analyzed:           its `AnalyzedText`
+    token_lengths:      length of each token
+    token_raw_starts:   offset in `raw_text` of the whitespace-separated word each token comes from
+    kept_positions:     index (in tokens) of each token that is not a stop word
+    kept_tokens:        those tokens, n-grams are built over them
+    ngram_starts:       per n-gram size (from min_n), index (in kept tokens) where each found n-gram starts
+    ngram_ids:          per n-gram size, feature index of each found n-gram
+    counts:             feature index -> number of occurrences
+    """
+    __slots__ = ['raw_text', 'analyzed', 'token_lengths', 'token_raw_starts', 'kept_positions', 'kept_tokens',
+                 'ngram_starts', 'ngram_ids', 'counts']
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs[name])
+
+    @property
+    def nbytes(self):
+        """
+        Rough estimate of memory used (the `AnalyzedText` shares its tokens and is counted separately).
+        """
+        arrays = [self.token_lengths, self.token_raw_starts, self.kept_positions] + self.ngram_starts + self.ngram_ids
+        return (sum(a.nbytes for a in arrays) + sys.getsizeof(self.raw_text) + sys.getsizeof(self.kept_tokens)
+                + sys.getsizeof(self.counts) + sys.getsizeof(self.analyzed.tokens))
+
+
+class IncrementalAnalyzer:
+    """
+    Incremental version of a `FusedAnalyzer`, see module docstring.
+    """
+    def __init__(self, analyzer):
+        if not self.supports(analyzer):
+            raise ValueError(f"Unsupported token_pattern for incremental analysis: {analyzer.config['token_pattern']!r}")
+        self.analyzer = analyzer
+        self.n_sizes = list(range(analyzer.min_n, analyzer.max_n + 1))
+        self.empty_state = IncrementalState(
+            raw_text='',
+            analyzed=None,
+            token_lengths=_EMPTY,
+            token_raw_starts=_EMPTY,
+            kept_positions=_EMPTY,
+            kept_tokens=[],
+            ngram_starts=[_EMPTY for _ in self.n_sizes],
+            ngram_ids=[_EMPTY for _ in self.n_sizes],
+            counts={},
+        )
+
+    @staticmethod
+    def supports(analyzer):
+        return analyzer.config['token_pattern'] in LOCAL_TOKEN_PATTERNS
+
+    def analyze(self, raw_text):
+        """
+        `IncrementalState` of `raw_text`, from scratch.
+        """
+        return self.update(self.empty_state, raw_text)
+
+    def _tokenize_window(self, raw_text, start, end):
+        """
+        Tokens of `raw_text[start:end]` (which starts & ends at word boundaries), and the raw offset of each token's word.
+        """
+        analyzer = self.analyzer
+        preprocess, tokenize = analyzer.preprocess, analyzer.tokenize
+        tokens = []
+        raw_starts = []
+        for match in _raw_words.finditer(raw_text, start, end):
+            word_tokens = tokenize(preprocess(match.group()))
+            tokens += word_tokens
+            raw_starts += [match.start()] * len(word_tokens)
+        return tokens, np.asarray(raw_starts, dtype=np.int64).reshape(-1)
+
+    def edited_length(self, state, raw_text):
+        """
+        Number of characters of `raw_text` that differ from `state`'s text (outside their common prefix & suffix).
+        """
+        old_text = state.raw_text
+        prefix_length = _common_prefix_length(old_text, raw_text)
+        suffix_length = _common_suffix_length(old_text, raw_text, min(len(old_text), len(raw_text)) - prefix_length)
+        return len(raw_text) - prefix_length - suffix_length
+
+    def update(self, state, raw_text):
+        """
+        `IncrementalState` of `raw_text`, from the `IncrementalState` of a previous version of the text.
+        `state` is left unchanged.
+        """
+        analyzer = self.analyzer
+        old_text = state.raw_text
+
+        ########################################
+        # EDITED WINDOW
+        ########################################
+        prefix_length = _common_prefix_length(old_text, raw_text)
+        suffix_length = _common_suffix_length(old_text, raw_text, min(len(old_text), len(raw_text)) - prefix_length)
+
+        # Expand to whitespace, a word touching the edit may merge with (or split from) the edited text
+        window_start = prefix_length
+        while window_start > 0 and not old_text[window_start - 1].isspace():
+            window_start -= 1
+        old_window_end = len(old_text) - suffix_length
+        while old_window_end < len(old_text) and not old_text[old_window_end].isspace():
+            old_window_end += 1
+        raw_shift = len(raw_text) - len(old_text)
+        new_window_end = old_window_end + raw_shift
+
+        ########################################
+        # TOKENS
+        ########################################
+        # Old tokens [t0, t1) came from words in the window
+        t0 = int(np.searchsorted(state.token_raw_starts, window_start, 'left'))
+        t1 = int(np.searchsorted(state.token_raw_starts, old_window_end, 'left'))
+        window_tokens, window_raw_starts = self._tokenize_window(raw_text, window_start, new_window_end)
+        token_shift = len(window_tokens) - (t1 - t0)
+
+        old_tokens = state.analyzed.tokens if state.analyzed is not None else []
+        tokens = old_tokens[:t0] + window_tokens + old_tokens[t1:]
+        window_token_lengths = np.fromiter((len(t) for t in window_tokens), dtype=np.int64, count=len(window_tokens))
+        token_lengths = np.concatenate([state.token_lengths[:t0], window_token_lengths, state.token_lengths[t1:]])
+        token_raw_starts = np.concatenate([
+            state.token_raw_starts[:t0], window_raw_starts, state.token_raw_starts[t1:] + raw_shift])
+
+        # Kept (not stop word) tokens [k0, k1) were among [t0, t1)
+        k0 = int(np.searchsorted(state.kept_positions, t0, 'left'))
+        k1 = int(np.searchsorted(state.kept_positions, t1, 'left'))
+        stop_words = analyzer.stop_words
+        if stop_words is not None:
+            window_kept = [i for i, w in enumerate(window_tokens) if w not in stop_words]
+            window_kept_tokens = [window_tokens[i] for i in window_kept]
+        else:
+            window_kept = range(len(window_tokens))
+            window_kept_tokens = window_tokens
+        kept_shift = len(window_kept_tokens) - (k1 - k0)
+
+        kept_tokens = state.kept_tokens[:k0] + window_kept_tokens + state.kept_tokens[k1:]
+        kept_positions = np.concatenate([
+            state.kept_positions[:k0],
+            np.asarray(window_kept, dtype=np.int64).reshape(-1) + t0,
+            state.kept_positions[k1:] + token_shift,
+        ])
+
+        ########################################
+        # N-GRAMS & COUNTS
+        ########################################
+        counts = dict(state.counts)
+        space_join = ' '.join
+        ngram_starts = []
+        ngram_ids = []
+        for size_index, n in enumerate(self.n_sizes):
+            old_starts = state.ngram_starts[size_index]
+            old_ids = state.ngram_ids[size_index]
+
+            # n-grams overlapping the edited kept tokens, before & after the edit
+            first_start = max(0, k0 - n + 1)
+            a = int(np.searchsorted(old_starts, first_start, 'left'))
+            b = int(np.searchsorted(old_starts, k1, 'left'))
+            for feature_id in old_ids[a:b].tolist():
+                count = counts[feature_id] - 1
+                if count == 0:
+                    del counts[feature_id]
+                else:
+                    counts[feature_id] = count
+
+            end_start = min(k0 + len(window_kept_tokens), len(kept_tokens) - n + 1)
+            window_starts = np.arange(first_start, max(first_start, end_start), dtype=np.int64)
+            term_ids = analyzer.lookup([space_join(kept_tokens[i: i + n]) for i in window_starts.tolist()])
+            found = term_ids >= 0
+            window_ids = term_ids[found]
+            for feature_id in window_ids.tolist():
+                counts[feature_id] = counts.get(feature_id, 0) + 1
+
+            ngram_starts.append(np.concatenate([old_starts[:a], window_starts[found], old_starts[b:] + kept_shift]))
+            ngram_ids.append(np.concatenate([old_ids[:a], window_ids, old_ids[b:]]))
+
+        ########################################
+        # ANALYZED TEXT
+        ########################################
+        token_starts = np.zeros(len(tokens), dtype=np.int64)
+        if len(tokens) > 1:
+            token_starts[1:] = np.cumsum(token_lengths[:-1] + 1)
+
+        # Same order as `FusedAnalyzer.analyze`: by n-gram size, then position
+        feature_ids = np.concatenate(ngram_ids)
+        feature_kept_starts = np.concatenate(ngram_starts)
+        feature_sizes = np.concatenate([np.full(len(starts), n, dtype=np.int64) for n, starts in zip(self.n_sizes, ngram_starts)])
+        feature_token_starts = kept_positions[feature_kept_starts]
+        feature_token_ends = kept_positions[feature_kept_starts + feature_sizes - 1] + 1
+
+        analyzed = AnalyzedText(
+            text=' '.join(tokens),
+            tokens=tokens,
+            token_starts=token_starts,
+            token_ends=token_starts + token_lengths,
+            feature_ids=feature_ids,
+            feature_token_starts=feature_token_starts,
+            feature_token_ends=feature_token_ends,
+            x=self._tfidf_row(counts),
+        )
+        return IncrementalState(
+            raw_text=raw_text,
+            analyzed=analyzed,
+            token_lengths=token_lengths,
+            token_raw_starts=token_raw_starts,
+            kept_positions=kept_positions,
+            kept_tokens=kept_tokens,
+            ngram_starts=ngram_starts,
+            ngram_ids=ngram_ids,
+            counts=counts,
+        )
+
+    def _tfidf_row(self, counts):
+        """
+        (1, n_features) CSR TF-IDF row from term counts, same as `FusedAnalyzer`'s (sorted indices).
+        """
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        order = np.argsort(indices)
+        X = sp.csr_matrix(
+            (values[order], indices[order], np.array([0, len(indices)], dtype=np.int64)),
+            shape=(1, self.analyzer.n_features))
+        return apply_tfidf(X, self.analyzer.config, self.analyzer.idf)
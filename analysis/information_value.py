@@ -0,0 +1,112 @@
+"""
+Information value (IV) and weight of evidence (WOE) of every feature, from the training matrix and labels.
+
+A feature is treated as a binary variable (present / absent in a document). For each class, one-vs-rest:
+
+    dist_event(bin)    = (number of documents of the class in bin + smoothing) / (documents of the class + 2 * smoothing)
+    dist_nonevent(bin) = same, for documents of the other classes
+    WOE(bin)           = ln(dist_event(bin) / dist_nonevent(bin))
+    IV                 = sum over bins of (dist_event(bin) - dist_nonevent(bin)) * WOE(bin)
+
+For a binary model both classes get the same IV, with opposite WOE. A feature ranks as informative *for* a class
+when its WOE of being present is positive, i.e. it appears relatively more often in documents of that class.
+"""
+import numpy as np
+
+DEFAULT_SMOOTHING = 0.5
+
+
+def class_document_counts(X, labels, n_classes):
+    """
+    (n_features, n_classes) number of documents of each class containing each feature, in one pass over `X`'s nonzeros.
+    `labels`: class index of each document.
+    """
+    n_documents, n_features = X.shape
+    nonzero = X.data != 0
+    feature_ids = X.indices[nonzero].astype(np.int64)
+    doc_ids = np.repeat(np.arange(n_documents), np.diff(X.indptr))[nonzero]
+    counts = np.bincount(feature_ids * n_classes + np.asarray(labels)[doc_ids], minlength=n_features * n_classes)
+    return counts.reshape(n_features, n_classes)
+
+def compute_information_values(class_counts, class_totals, smoothing=DEFAULT_SMOOTHING):
+    """
+    One-vs-rest IV and WOE (of presence) from `class_document_counts` and number of documents per class.
+    Returns (iv, woe), both (n_features, n_classes).
+    """
+    class_counts = np.asarray(class_counts, dtype=np.float64)
+    class_totals = np.asarray(class_totals, dtype=np.float64)
+
+    event_present = class_counts
+    nonevent_present = class_counts.sum(axis=1, keepdims=True) - class_counts
+    event_total = class_totals[np.newaxis, :]
+    nonevent_total = class_totals.sum() - event_total
+
+    def dist(count, total):
+        return (count + smoothing) / (total + 2 * smoothing)
+
+    event_dists = [dist(event_present, event_total), dist(event_total - event_present, event_total)]
+    nonevent_dists = [dist(nonevent_present, nonevent_total), dist(nonevent_total - nonevent_present, nonevent_total)]
+
+    woe_present = np.log(event_dists[0] / nonevent_dists[0])
+    iv = np.zeros_like(woe_present)
+    for event_dist, nonevent_dist in zip(event_dists, nonevent_dists):
+        iv += (event_dist - nonevent_dist) * np.log(event_dist / nonevent_dist)
+    return iv, woe_present
+
+
+class InformationValueTable:
+    """
+    IV & WOE of every feature for every class, plus features ranked per class (most informative for it first).
+    Rankings are stored CSR-like: `ranked_feature_ids[ranking_indptr[c]:ranking_indptr[c+1]]` for class index `c`.
+    """
+    # Part of the cache key of stored tables: bump when IV/WOE or rankings are computed differently
+    VERSION = 1
+
+    def __init__(self, iv, woe, ranking_indptr, ranked_feature_ids):
+        self.iv = iv
+        self.woe = woe
+        self.ranking_indptr = ranking_indptr
+        self.ranked_feature_ids = ranked_feature_ids
+
+    @classmethod
+    def build(cls, X, labels, n_classes, smoothing=DEFAULT_SMOOTHING):
+        """
+        `X`: (n_documents, n_features) sparse matrix, `labels`: class index of each document.
+        """
+        labels = np.asarray(labels).astype(np.int64)
+        class_counts = class_document_counts(X, labels, n_classes)
+        class_totals = np.bincount(labels, minlength=n_classes)
+        iv, woe = compute_information_values(class_counts, class_totals, smoothing=smoothing)
+
+        rankings = []
+        for c in range(n_classes):
+            candidates = np.flatnonzero(woe[:, c] > 0)
+            # Highest IV first, ties broken by feature id
+            rankings.append(candidates[np.lexsort((candidates, -iv[candidates, c]))])
+        ranking_indptr = np.zeros(n_classes + 1, dtype=np.int64)
+        ranking_indptr[1:] = np.cumsum([len(r) for r in rankings])
+        return cls(iv, woe, ranking_indptr, np.concatenate(rankings))
+
+    def top_features(self, class_index, top_k):
+        """
+        (feature ids, IV values) of the `top_k` most informative features for class index `class_index`.
+        """
+        start = self.ranking_indptr[class_index]
+        end = min(self.ranking_indptr[class_index + 1], start + top_k)
+        feature_ids = self.ranked_feature_ids[start:end]
+        return feature_ids, self.iv[feature_ids, class_index]
+
+    def to_arrays(self):
+        """
+        For `derived_cache`.
+        """
+        return {
+            'iv': self.iv,
+            'woe': self.woe,
+            'ranking_indptr': self.ranking_indptr,
+            'ranked_feature_ids': self.ranked_feature_ids,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['iv'], arrays['woe'], arrays['ranking_indptr'], arrays['ranked_feature_ids'])
@@ -0,0 +1,112 @@
+"""
+Direct probability computation for linear classifiers (logistic regression), from `coef_`, `intercept_`, `classes_`.
+
+Same results as sklearn's `predict_proba`, without its input validation and dense/sparse dispatch, which dominate the
+cost of scoring a single (sparse) document.
+"""
+import math
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def get_classifier_mode(clf):
+    """
+    'binary': one coefficient row, sigmoid. 'multinomial': softmax. 'ovr': normalized per-class sigmoids.
+    """
+    if len(clf.classes_) == 2 and clf.coef_.shape[0] == 1:
+        return 'binary'
+    multi_class = getattr(clf, 'multi_class', None)
+    if multi_class in ('ovr', 'warn'): # 'warn' is sklearn 0.20's default, which behaves as 'ovr'
+        return 'ovr'
+    if multi_class == 'multinomial':
+        return 'multinomial'
+    # 'auto' (or newer sklearn without `multi_class`): multinomial, except for liblinear
+    return 'ovr' if getattr(clf, 'solver', None) == 'liblinear' else 'multinomial'
+
+def _sigmoid(z):
+    # Numerically stable for large |z|
+    if z >= 0:
+        return 1. / (1. + math.exp(-z))
+    exp_z = math.exp(z)
+    return exp_z / (1. + exp_z)
+
+def probabilities_from_scores(scores, mode):
+    """
+    `scores`: (n_samples, n_coef_rows) decision function values. Returns (n_samples, n_classes) probabilities.
+    """
+    if mode == 'binary':
+        positive = 1. / (1. + np.exp(-scores[:, 0]))
+        return np.vstack([1 - positive, positive]).T
+    if mode == 'multinomial':
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp_scores = np.exp(scores)
+        return exp_scores / exp_scores.sum(axis=1, keepdims=True)
+    if mode == 'ovr':
+        probs = 1. / (1. + np.exp(-scores))
+        return probs / probs.sum(axis=1, keepdims=True)
+    raise ValueError(f'Invalid classifier mode: {mode!r}')
+
+
+class LinearScorer:
+    """
+    Scores sparse feature rows with a fitted linear classifier.
+    """
+    # Bump when scores change, cached predictions (`derived_cache`) are then recomputed
+    VERSION = 1
+
+    def __init__(self, coef, intercept, classes, mode, coef_by_feature=None):
+        self.coef = np.asarray(coef)
+        self.intercept = np.asarray(intercept, dtype=np.float64)
+        self.classes = np.asarray(classes)
+        self.mode = mode
+
+        # feature-major, so gathering the coefficients of a row's features reads contiguous memory. Model artifacts
+        # provide it memory-mapped (shared by all workers), otherwise it is a copy of `coef`
+        if coef_by_feature is None:
+            coef_by_feature = np.ascontiguousarray(self.coef.T)
+        self.coef_by_feature = np.asarray(coef_by_feature)
+        if mode == 'binary':
+            self.binary_coef = self.coef_by_feature[:, 0]
+            self.binary_intercept = float(self.intercept[0])
+
+    @classmethod
+    def from_classifier(cls, clf):
+        mode = getattr(clf, 'mode', None) or get_classifier_mode(clf)
+        return cls(clf.coef_, clf.intercept_, clf.classes_, mode, coef_by_feature=getattr(clf, 'coef_by_feature', None))
+
+    def decision_function_row(self, indices, data):
+        return np.dot(data, self.coef_by_feature[indices]) + self.intercept
+
+    def predict_proba_row(self, indices, data):
+        """
+        Probabilities (n_classes,) of one document, given its nonzero feature `indices` and values `data`.
+        """
+        if self.mode == 'binary':
+            positive = _sigmoid(float(np.dot(self.binary_coef[indices], data)) + self.binary_intercept)
+            return np.array([1. - positive, positive])
+        scores = self.decision_function_row(indices, data)
+        return probabilities_from_scores(scores[np.newaxis, :], self.mode)[0]
+
+    def contributions_row(self, indices, data):
+        """
+        Contribution (coefficient * feature value) of each nonzero feature of one document to each coefficient row's
+        decision function, (len(indices), n_coef_rows). Rows sum (+ intercept) to `decision_function_row`.
+        """
+        return self.coef_by_feature[indices] * np.asarray(data)[:, np.newaxis]
+
+    def decision_function(self, X):
+        """
+        Batched decision function for (n_samples, n_features) sparse or dense `X`.
+        """
+        if sp.issparse(X):
+            return np.asarray(X.dot(self.coef_by_feature)) + self.intercept
+        return np.dot(np.atleast_2d(X), self.coef_by_feature) + self.intercept
+
+    def predict_proba(self, X):
+        """
+        Batched variant: probabilities (n_samples, n_classes) of every row of `X`.
+        """
+        if sp.isspmatrix_csr(X) and X.shape[0] == 1:
+            return self.predict_proba_row(X.indices, X.data)[np.newaxis, :]
+        return probabilities_from_scores(self.decision_function(X), self.mode)
@@ -0,0 +1,72 @@
+"""
+Shared vs. private memory of gunicorn workers (Linux only, reads `/proc`).
+
+With `--preload`, workers are forked from a master that already loaded the models. Pages that no worker wrote to
+stay shared, so `shared` should be large and `private` small for every worker.
+
+Usage (run from project root):
+    python -m analysis.memory_report <gunicorn master pid>
+"""
+import os
+import sys
+
+# smaps fields (in kB) summed into each column
+MEMORY_FIELDS = {
+    'rss': ['Rss'],
+    'pss': ['Pss'],
+    'shared': ['Shared_Clean', 'Shared_Dirty'],
+    'private': ['Private_Clean', 'Private_Dirty'],
+}
+
+
+def read_memory_usage(pid):
+    """
+    Return dict of memory usage in kB: rss, pss (proportional set size), shared and private.
+    """
+    path = f'/proc/{pid}/smaps_rollup'
+    if not os.path.exists(path):
+        # Older kernels (< 4.14), sum over all mappings instead
+        path = f'/proc/{pid}/smaps'
+
+    values = {}
+    with open(path) as fin:
+        for line in fin:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                field = parts[0].rstrip(':')
+                values[field] = values.get(field, 0) + int(parts[1])
+
+    return {name: sum(values.get(field, 0) for field in fields) for name, fields in MEMORY_FIELDS.items()}
+
+def get_child_pids(pid):
+    child_pids = []
+    task_dir = f'/proc/{pid}/task'
+    for tid in os.listdir(task_dir):
+        children_path = os.path.join(task_dir, tid, 'children')
+        if os.path.exists(children_path):
+            with open(children_path) as fin:
+                child_pids += [int(p) for p in fin.read().split()]
+    return sorted(set(child_pids))
+
+def format_memory_report(master_pid):
+    rows = [('master', master_pid, read_memory_usage(master_pid))]
+    rows += [('worker', pid, read_memory_usage(pid)) for pid in get_child_pids(master_pid)]
+
+    lines = [f"{'process':<8} {'pid':>8} {'rss MB':>10} {'pss MB':>10} {'shared MB':>10} {'private MB':>10} {'shared %':>9}"]
+    for role, pid, usage in rows:
+        shared_percent = 100. * usage['shared'] / usage['rss'] if usage['rss'] > 0 else 0.
+        lines.append(
+            f"{role:<8} {pid:>8} {usage['rss'] / 1024:>10.1f} {usage['pss'] / 1024:>10.1f} "
+            f"{usage['shared'] / 1024:>10.1f} {usage['private'] / 1024:>10.1f} {shared_percent:>8.1f}%")
+
+    total_pss = sum(usage['pss'] for _, _, usage in rows)
+    total_rss = sum(usage['rss'] for _, _, usage in rows)
+    lines.append(f"Total: pss {total_pss / 1024:.1f} MB (actual memory used), rss {total_rss / 1024:.1f} MB (counts shared pages once per process)")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    print(format_memory_report(int(sys.argv[1])))
@@ -0,0 +1,132 @@
+"""
+Micro-batching of concurrent single-document requests.
+
+Under load, every callback (or API request) analyzing a new text used to score its own single row. `MicroBatcher`
+collects the items submitted by concurrent callers during a short window (`max_wait_seconds`, or until
+`max_batch_size` items are waiting), processes them with one call of `process_batch`, and hands each caller its own
+result. Batch sizes and queue delays are recorded in `BatchMetrics`.
+
+The worker thread is started on first use, in each process (so it works with gunicorn `--preload` forking).
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+
+class BatchMetrics:
+    """
+    Counters of processed batches: sizes, time items waited in queue, and time spent processing.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.n_batches = 0
+        self.n_items = 0
+        self.batch_sizes = Counter()
+        self.total_queue_delay = 0.
+        self.max_queue_delay = 0.
+        self.total_processing_time = 0.
+
+    def record(self, queue_delays, processing_time):
+        with self._lock:
+            self.n_batches += 1
+            self.n_items += len(queue_delays)
+            self.batch_sizes[len(queue_delays)] += 1
+            self.total_queue_delay += sum(queue_delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(queue_delays))
+            self.total_processing_time += processing_time
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.n_batches,
+                'items': self.n_items,
+                'mean_batch_size': self.n_items / self.n_batches if self.n_batches else 0.,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'mean_queue_delay_ms': 1e3 * self.total_queue_delay / self.n_items if self.n_items else 0.,
+                'max_queue_delay_ms': 1e3 * self.max_queue_delay,
+                'mean_processing_ms': 1e3 * self.total_processing_time / self.n_batches if self.n_batches else 0.,
+            }
+
+
+class _PendingItem:
+    __slots__ = ['item', 'enqueued_at', 'done', 'result', 'error']
+
+    def __init__(self, item):
+        self.item = item
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    """
+    `process_batch(items)` must return one result per item, in order. An exception fails every item of the batch.
+    """
+    def __init__(self, process_batch, max_batch_size, max_wait_seconds, name='micro-batcher'):
+        assert max_batch_size >= 1, '`max_batch_size` must be at least 1.'
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.name = name
+        self.metrics = BatchMetrics()
+
+        self._pending = []
+        self._condition = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+    def submit(self, item):
+        """
+        Result of `item`, once processed in a batch. Blocks the caller until then.
+        """
+        pending = _PendingItem(item)
+        with self._condition:
+            self._ensure_worker()
+            self._pending.append(pending)
+            self._condition.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, a forked worker process starts its own
+        if self._worker_pid != os.getpid():
+            # Items pending in the parent process are not ours to process
+            self._pending = []
+            self._worker = None
+        if self._worker is None or not self._worker.is_alive():
+            self._worker_pid = os.getpid()
+            self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._worker.start()
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._pending:
+                self._condition.wait()
+            deadline = self._pending[0].enqueued_at + self.max_wait_seconds
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started_at = time.perf_counter()
+            try:
+                results = self.process_batch([pending.item for pending in batch])
+                for pending, result in zip(batch, results):
+                    pending.result = result
+            except Exception as error:
+                for pending in batch:
+                    pending.error = error
+            self.metrics.record([started_at - pending.enqueued_at for pending in batch], time.perf_counter() - started_at)
+            for pending in batch:
+                pending.done.set()
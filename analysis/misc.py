@@ -97,21 +97,15 @@ def hex_string_to_rgb(hex_string):
 
 
 def read_news_data(tarfname='news_dataset.tar.gz'):
-    import tarfile
-    tar = tarfile.open(tarfname, "r:gz")
-    name_train_data = "news_dataset/news_data_train.txt"
-    name_train_labels = "news_dataset/news_labels_train.txt"
-    name_test_data = "news_dataset/news_data_test.txt"
-    name_test_labels = "news_dataset/news_labels_test.txt"
-    
-    def read_lines_from_tar(fname):
-        member = tar.getmember(fname)
-        tf = tar.extractfile(member)
-        return [eval(line.decode('utf-8')).strip() for line in tf]
+    """
+    Read news dataset, each field is a `TextColumn` (see `analysis/corpus_store.py`).
+
+    Available fields: ['train_data', 'train_labels', 'test_data', 'test_labels']
+    """
+    from analysis.corpus_store import read_news_columns
     
     class Data: pass
     news = Data()
-    news.train_data, news.train_labels = read_lines_from_tar(name_train_data), read_lines_from_tar(name_train_labels)
-    news.test_data, news.test_labels = read_lines_from_tar(name_test_data), read_lines_from_tar(name_test_labels)
-    tar.close()
+    for name, column in read_news_columns(tarfname).items():
+        setattr(news, name, column)
     return news  
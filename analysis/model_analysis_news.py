@@ -1,29 +1,50 @@
-import plotly.graph_objs as go
 import dash_html_components as html
 
 import numpy as np
-import re 
 
 from analysis.misc import rgba, get_relative_strengths, hex_string_to_rgb
+from analysis import figures
 from analysis.global_vars import news_model as model
 from analysis.global_vars import UI_STYLES
+from analysis.global_vars import requires_section
+from analysis.global_vars import get_news_information_values
+from analysis.analysis_cache import get_text_analysis, get_text_analyses
+from analysis.batch_explanation import explain_documents, RANK_BY_VALUE
+from analysis.span_attribution import analyzed_feature_spans, split_text_by_spans
 from analysis.model_analysis_user_review import FeatureDisplayMode
 
-def preprocess(raw_input_text):
-    text = model.fv_text_preprocessor(raw_input_text)
-    text = ' '.join(model.fv_text_tokenize(text))
-    return text
-
+@requires_section('news')
+def get_analysis(raw_input_text, session_id=None):
+    """
+    Memoized `TextAnalysis` (analyzed text, probabilities, contributions) of input text, shared across callbacks.
+    With `session_id`, a new text is analyzed incrementally from the session's previous one.
+    """
+    return get_text_analysis('news', model, raw_input_text, session_id=session_id)
+
+@requires_section('news')
+def get_analyses(raw_input_texts):
+    """
+    `get_analysis` of each input text, the ones not cached yet are analyzed in one batch.
+    """
+    return get_text_analyses('news', model, raw_input_texts)
+
+def analyze_text(raw_input_text, session_id=None):
+    """
+    Single-pass analysis (tokens, offsets, features, TF-IDF) of input text, see `FusedAnalyzer`.
+    """
+    return get_analysis(raw_input_text, session_id=session_id).analyzed
+
+def preprocess(raw_input_text, session_id=None):
+    return analyze_text(raw_input_text, session_id=session_id).text
+
+@requires_section('news')
 def make_prediction(sentence):
     """Predict (already-preprocessed) news"""
     assert sentence is not None and sentence != '', "Invalid sentence"
 
-    fv = model.fv
     clf = model.clf
 
-    x = fv.transform([sentence])
-
-    prob_x = clf.predict_proba(x)[0]
+    prob_x = get_analysis(sentence).probs
 
     probs_sorted = prob_x.argsort()[::-1]
     
@@ -34,11 +55,12 @@ def make_prediction(sentence):
         top_categories_with_probs=top_categories_with_probs
     )
 
+@requires_section('news')
 def make_prediction_probability_pie_chart(top_categories_with_probs):
     categories = [cat for cat, _ in top_categories_with_probs]
     category_probs = [prob for _, prob in top_categories_with_probs]
 
-    pie_trace = go.Pie(
+    pie_trace = figures.pie(
         labels=categories,
         values=category_probs,
         hoverinfo='label+percent',
@@ -50,13 +72,10 @@ def make_prediction_probability_pie_chart(top_categories_with_probs):
         ),
     )
 
-    pie_layout = go.Layout(
-        title=f"Probabilities by categories",
-    )
-    
-    pie_figure = go.Figure(data=[pie_trace], layout=pie_layout)
+    pie_figure = figures.figure([pie_trace], figures.layout('pie', title="Probabilities by categories"))
     return pie_figure
 
+@requires_section('news')
 def make_top_three_predicted_categories(top_categories_with_probs):
     TOP_K = 3
     top_k_categories = top_categories_with_probs[:TOP_K]
@@ -69,11 +88,28 @@ def make_top_three_predicted_categories(top_categories_with_probs):
         for i, (cat, prob) in enumerate(top_k_categories)
     ])
     
+@requires_section('news')
 def get_random_sample():
     n_test_data = len(model.news_data.test_data)
     ind = np.random.randint(n_test_data)
     return model.news_data.test_data[ind]
 
+def get_category_feature_strengths(analysis, category_index, display_mode):
+    """
+    Values (according to `display_mode`) of the nonzero features of an analyzed text (in `x.indices` order),
+    towards category `category_index`.
+    """
+    x = analysis.analyzed.x
+    if display_mode == FeatureDisplayMode.prediction_contribution:
+        return analysis.contributions[:, category_index]
+    elif display_mode == FeatureDisplayMode.feature_weight:
+        return model.scorer.coef_by_feature[x.indices, category_index]
+    elif display_mode == FeatureDisplayMode.raw_feature_tfidf:
+        return x.data
+    else:
+        raise ValueError("Invalid `display_mode` type.")
+
+@requires_section('news')
 def make_news_feature_highlights_bar_graph_div(
     text_input, 
     target_category, 
@@ -81,27 +117,16 @@ def make_news_feature_highlights_bar_graph_div(
     highlight_top_k_features=10
     ):
 
-    clf = model.clf
-    fv = model.fv
-
-    category_index = list(clf.classes_).index(target_category)
-    category_coefficients = clf.coef_[category_index]
-
-    x = fv.transform([text_input]).toarray().flatten()
-    coef_feature_products = category_coefficients * x
-
-    nonzero_inds = x.nonzero()[0]
+    # Contributions of every feature to every category were computed once for this text (see `analysis_cache`),
+    # switching category or display mode only selects a column
+    analysis = get_analysis(text_input)
+    analyzed = analysis.analyzed
+    x = analyzed.x
+    category_index = model.class_to_index[target_category]
 
-    nonzero_strength_values = None
+    nonzero_inds = x.indices
+    nonzero_strength_values = get_category_feature_strengths(analysis, category_index, display_mode)
     figure_title = display_mode.title
-    if display_mode == FeatureDisplayMode.prediction_contribution:
-        nonzero_strength_values = coef_feature_products[nonzero_inds]
-    elif display_mode == FeatureDisplayMode.feature_weight:
-        nonzero_strength_values = category_coefficients[nonzero_inds]
-    elif display_mode == FeatureDisplayMode.raw_feature_tfidf:
-        nonzero_strength_values = x[nonzero_inds]
-    else:
-        raise ValueError("Invalid `display_mode` type.")
 
     argsort_nonzero_strengh_values = nonzero_strength_values.argsort()[::-1]
 
@@ -112,25 +137,22 @@ def make_news_feature_highlights_bar_graph_div(
     # feature names for these inds
     nonzero_features = [model.feature_names[i] for i in nonzero_inds]
 
-    all_feature_strings = '|'.join(nonzero_features)
-    regex_pattern = f"\\b{all_feature_strings}\\b"
-    regex_compiled = re.compile(regex_pattern)
-    matches = regex_compiled.findall(text_input) # m - 1
-    neighbors = regex_compiled.split(text_input) # m
+    spans = analyzed_feature_spans(analyzed, nonzero_inds)
 
     highlight_color = model.category_to_colors[target_category]
     highlight_color_rgb = hex_string_to_rgb(highlight_color)
-    div_children = [neighbors[0]]
-    for i in range(len(matches)):
-        span = html.Span(matches[i], 
-            className='news-feature-tag-highlighted', 
-            style={'background-color': rgba(*highlight_color_rgb, 0.8)}
-        )
-        div_children.append(span)
-        div_children.append(neighbors[i+1])
-
-
-    feature_strengths_trace = go.Bar(
+    div_children = []
+    for text, feature_ind in split_text_by_spans(analyzed.text, spans):
+        if feature_ind is None:
+            div_children.append(text)
+        else:
+            div_children.append(html.Span(text, 
+                className='news-feature-tag-highlighted', 
+                style={'background-color': rgba(*highlight_color_rgb, 0.8)}
+            ))
+
+
+    feature_strengths_trace = figures.bar(
         x = nonzero_features,
         y = nonzero_strength_values,
         name = target_category,
@@ -143,26 +165,15 @@ def make_news_feature_highlights_bar_graph_div(
             }
         })
 
-    bar_graph_feature_contribution = {
-        'data': [
-            feature_strengths_trace
-        ],
-        'layout': go.Layout(
-            title=figure_title,
-            yaxis=dict(
-                automargin=True,
-                fixedrange=True,
-            ),
-            xaxis=dict(
-                automargin=True,
-                fixedrange=True,
-            ),
-        ),
-    }
+    bar_graph_feature_contribution = figures.figure(
+        [feature_strengths_trace],
+        figures.layout('feature_strengths', title=figure_title),
+    )
     
     return html.Div(div_children, id='news-feature-tag-sentence-wrapper-div'), bar_graph_feature_contribution
     
 
+@requires_section('news')
 def make_top_prediction_result_div(top_category, top_prob):
     prediction_output_div = html.Div([
         html.Div([
@@ -179,3 +190,60 @@ def make_top_prediction_result_div(top_category, top_prob):
     }, 
     className='ui statistic')
     return prediction_output_div
+
+@requires_section('news')
+def explain_news(raw_text, top_k=10, category=None, display_mode=FeatureDisplayMode.prediction_contribution):
+    """
+    Prediction & explanation of one news text as a json-able dict (no figures), for the HTTP API.
+
+    Contributions are the `top_k` highest feature values towards `category` (default: the predicted one), spans are
+    their (start, end, feature) occurrences in the preprocessed `text`, as highlighted in the UI.
+    """
+    return explain_news_analysis(get_analysis(raw_text), top_k, category, display_mode)
+
+@requires_section('news')
+def explain_news_batch(raw_texts, top_k=10, category=None, display_mode=FeatureDisplayMode.prediction_contribution):
+    """
+    `explain_news` of each text, analyzed in one batch.
+    """
+    return [explain_news_analysis(analysis, top_k, category, display_mode) for analysis in get_analyses(raw_texts)]
+
+@requires_section('news')
+def explain_news_documents(raw_texts, top_k=10, chunk_size=10000):
+    """
+    Batch explanation of many news texts: a `BatchExplanation` (predictions, top-k contributions towards the predicted
+    category) per chunk of `chunk_size` texts. See `analysis/batch_explanation.py`.
+    """
+    return explain_documents(raw_texts, model.analyzer, model.scorer, top_k=top_k, rank_by=RANK_BY_VALUE, chunk_size=chunk_size)
+
+def explain_news_analysis(analysis, top_k, category, display_mode):
+    analyzed = analysis.analyzed
+    classes = model.scorer.classes.tolist()
+    prediction = classes[int(analysis.probs.argmax())]
+    if category is None:
+        category = prediction
+    if category not in model.class_to_index:
+        raise ValueError(f'Unknown category: {category!r}')
+
+    values = get_category_feature_strengths(analysis, model.class_to_index[category], display_mode)
+    top = values.argsort()[::-1][:top_k]
+    top_inds = analyzed.x.indices[top]
+    feature_names = model.feature_names
+    return {
+        'text': analyzed.text,
+        'classes': classes,
+        'probabilities': analysis.probs.tolist(),
+        'prediction': prediction,
+        'category': category,
+        'contributions': [[feature_names[i], v] for i, v in zip(top_inds.tolist(), values[top].tolist())],
+        'spans': [[start, end, feature_names[i]] for start, end, i in analyzed_feature_spans(analyzed, top_inds)],
+    }
+
+def get_most_informative_features(category, top_k=10):
+    """
+    (feature, IV) of the `top_k` features with highest one-vs-rest information value for `category`.
+    """
+    information_values = get_news_information_values()
+    category_ind = model.class_to_index[category]
+    feature_ids, ivs = information_values.top_features(category_ind, top_k)
+    return [(model.feature_names[ind], float(iv)) for ind, iv in zip(feature_ids, ivs)]
@@ -1,15 +1,24 @@
-import plotly.graph_objs as go
 import numpy as np
 
 from analysis.misc import rgba
+from analysis import figures
 from analysis.global_vars import user_review_model
 from analysis.global_vars import UI_STYLES
+from analysis.global_vars import requires_section
+from analysis.analysis_cache import get_text_analysis, get_text_analyses
+from analysis.batch_explanation import explain_documents, RANK_BY_ABSOLUTE
+from analysis.span_attribution import FeatureSpanMatcher, analyzed_feature_spans, split_text_by_spans
 
 
 from analysis.misc import map_to_new_low_and_high, get_relative_strengths
 
 from enum import Enum
 
+# Sentiment prediction stacked bars, also used by the browser-side version in `assets/main.js`
+SP_FIGURE_TITLE = 'Positiveness vs Negativeness'
+SP_BASE_STRENGTH = 0.3
+SP_OTHERS_OPACITY = 0.1
+
 class FeatureDisplayMode(Enum):
     prediction_contribution = 'prediction_contribution'
     feature_weight = 'feature_weight'
@@ -29,65 +38,103 @@ class FeatureDisplayMode(Enum):
             raise ValueError("Invalid `display_mode` type.")
         return figure_title
 
-def preprocess(raw_input_text):
-    text = user_review_model.fv_text_preprocessor(raw_input_text)
-    text = ' '.join(user_review_model.fv_text_tokenize(text))
-    return text
+@requires_section('user_review')
+def get_analysis(raw_input_text, session_id=None):
+    """
+    Memoized `TextAnalysis` (analyzed text, probabilities, contributions) of input text, shared across callbacks.
+    With `session_id`, a new text is analyzed incrementally from the session's previous one.
+    """
+    return get_text_analysis('user_review', user_review_model, raw_input_text, session_id=session_id)
 
-def sort_features_human_friendly_order(tokens, features):    
+@requires_section('user_review')
+def get_analyses(raw_input_texts):
     """
-    Sort ngram features in order of input tokens.
+    `get_analysis` of each input text, the ones not cached yet are analyzed in one batch.
     """
-    preferred_ordered_features = []
+    return get_text_analyses('user_review', user_review_model, raw_input_texts)
 
-    # Short features last
-    features = sorted(features, key=len, reverse=True)
-    
-    for token in tokens:
-        # Iterate from last (shortest features first), and remove in-place*
-        for feature in reversed(features):
-            # Only add those that begins with current token
-            if feature.startswith(token):
-                preferred_ordered_features.append(feature)
-                features.remove(feature)
-    return preferred_ordered_features
+def analyze_text(raw_input_text, session_id=None):
+    """
+    Single-pass analysis (tokens, offsets, features, TF-IDF) of input text, see `FusedAnalyzer`.
+    """
+    return get_analysis(raw_input_text, session_id=session_id).analyzed
+
+def preprocess(raw_input_text, session_id=None):
+    return analyze_text(raw_input_text, session_id=session_id).text
+
+def sort_features_human_friendly_order(tokens, features):
+    """
+    Sort ngram features in order of input tokens.
 
+    A feature goes at the first token it begins with (as a string prefix), then shortest features first (same length:
+    last given first). Features that begin with no token are dropped. Since tokens have no spaces, only prefixes of a
+    feature's first word can match, so this looks up those prefixes in a token -> first position map instead of
+    comparing every feature with every token.
+    """
+    first_positions = {}
+    for position, token in enumerate(tokens):
+        first_positions.setdefault(token, position)
+
+    keyed_features = []
+    for i, feature in enumerate(features):
+        first_word = feature.split(' ', 1)[0]
+        positions = [first_positions[first_word[:length]] for length in range(len(first_word) + 1) if first_word[:length] in first_positions]
+        if positions:
+            keyed_features.append((min(positions), len(feature), -i, feature))
+    keyed_features.sort()
+    return [feature for _, _, _, feature in keyed_features]
+
+@requires_section('user_review')
 def get_random_sample():
     n_dev_total = len(user_review_model.sentiment.dev_data)
     return user_review_model.sentiment.dev_data[np.random.randint(n_dev_total)]
 
+def get_feature_strengths(x, coefficients, display_mode):
+    """
+    Nonzero feature indices of (1-row, CSR) `x`, and their values according to `display_mode`.
+    Works on the row's indices & data only, so the cost depends on number of features in input, not vocabulary size.
+    """
+    x = x.tocsr()
+    if not x.has_sorted_indices:
+        x.sort_indices()
+    nonzero_mask = x.data != 0
+    nonzero_inds = x.indices[nonzero_mask]
+    x_values = x.data[nonzero_mask]
+
+    if display_mode == FeatureDisplayMode.prediction_contribution:
+        nonzero_strength_values = coefficients[nonzero_inds] * x_values
+    elif display_mode == FeatureDisplayMode.feature_weight:
+        nonzero_strength_values = coefficients[nonzero_inds]
+    elif display_mode == FeatureDisplayMode.raw_feature_tfidf:
+        nonzero_strength_values = x_values
+    else:
+        raise ValueError("Invalid `display_mode` type.")
+    return nonzero_inds, np.asarray(nonzero_strength_values)
+
+@requires_section('user_review')
 def part1_analyze_coefficients(sentence, display_mode):
     """Analyze (already-preprocessed) review sentence"""
 
     assert isinstance(display_mode, FeatureDisplayMode), "`display_mode` must be `FeatureDisplayMode`."
 
     fv = user_review_model.fv
-    clf = user_review_model.clf
     clf_coefficients = user_review_model.clf_coefficients
     feature_names = user_review_model.feature_names
     # feature_names_set = user_review_model.feature_names_set
 
-    x = fv.transform([sentence]).toarray().flatten()
+    analysis = get_analysis(sentence)
+    analyzed = analysis.analyzed
+    x = analyzed.x
 
-    prob_x = clf.predict_proba([x])[0]
+    prob_x = analysis.probs
     pred_x = int(prob_x[1] > 0.5)
 
-    coef_feature_products = clf_coefficients * x
-
-    nonzero_inds = x.nonzero()[0]
+    nonzero_inds, nonzero_strength_values = get_feature_strengths(x, clf_coefficients, display_mode)
 
     if len(nonzero_inds) == 0:
         raise ValueError('No features detected.')
 
     figure_title = display_mode.title
-    if display_mode == FeatureDisplayMode.prediction_contribution:
-        nonzero_strength_values = coef_feature_products[nonzero_inds]
-    elif display_mode == FeatureDisplayMode.feature_weight:
-        nonzero_strength_values = clf_coefficients[nonzero_inds]
-    elif display_mode == FeatureDisplayMode.raw_feature_tfidf:
-        nonzero_strength_values = x[nonzero_inds]
-    else:
-        raise ValueError("Invalid `display_mode` type.")
 
     detected_features = [feature_names[ind] for ind in nonzero_inds]
 
@@ -95,9 +142,7 @@ def part1_analyze_coefficients(sentence, display_mode):
     # Show in feature extraction list
     ##################################
 
-    tokenize = fv.build_tokenizer()
-    tokens = tokenize(sentence)
-    human_sorted_features = sort_features_human_friendly_order(tokens, detected_features)
+    human_sorted_features = sort_features_human_friendly_order(analyzed.tokens, detected_features)
 
     feature_to_ind = fv.vocabulary_
     ind_to_feature_contribution = {ind: contrib for ind, contrib in zip(nonzero_inds, nonzero_strength_values)}
@@ -134,7 +179,7 @@ def part1_analyze_coefficients(sentence, display_mode):
         if abs_val > max_val:
             max_val = abs_val
 
-    positive_bars = go.Bar(
+    positive_bars = figures.bar(
         y = positive_feature_list,
         x = positive_feature_values,
         name = 'Positive',
@@ -149,7 +194,7 @@ def part1_analyze_coefficients(sentence, display_mode):
         },
     )
 
-    negative_bars = go.Bar(
+    negative_bars = figures.bar(
         y = negative_feature_list,
         x = negative_feature_values,
         name = 'Negative',
@@ -163,22 +208,10 @@ def part1_analyze_coefficients(sentence, display_mode):
         }
     )
         
-    figure_feature_contribution = {
-        'data': [
-            negative_bars,
-            positive_bars,
-        ],
-        'layout': go.Layout(
-            title=figure_title,
-            yaxis=dict(
-                autorange="reversed", 
-                automargin=True,
-            ),
-            xaxis=dict(
-                automargin=True,
-            ),
-        ),
-    }
+    figure_feature_contribution = figures.figure(
+        [negative_bars, positive_bars],
+        figures.layout('feature_contribution', title=figure_title),
+    )
 
     # Will used to later map in html UI e.g., opacity of elements based on strength
     relative_feature_strengths = get_relative_strengths(np.abs(human_sorted_values), 0.15, 1.0)
@@ -201,7 +234,87 @@ def part1_analyze_coefficients(sentence, display_mode):
     }
 
 
+@requires_section('user_review')
+def explain_review(raw_text, top_k=10, display_mode=FeatureDisplayMode.prediction_contribution):
+    """
+    Prediction & explanation of one review as a json-able dict (no figures), for the HTTP API.
+
+    Contributions are the `top_k` features with largest absolute value, spans are their (start, end, feature)
+    occurrences in the preprocessed `text`.
+    """
+    return explain_review_analysis(get_analysis(raw_text), top_k, display_mode)
+
+@requires_section('user_review')
+def explain_reviews(raw_texts, top_k=10, display_mode=FeatureDisplayMode.prediction_contribution):
+    """
+    `explain_review` of each text, analyzed in one batch.
+    """
+    return [explain_review_analysis(analysis, top_k, display_mode) for analysis in get_analyses(raw_texts)]
+
+@requires_section('user_review')
+def explain_review_documents(raw_texts, top_k=10, chunk_size=10000):
+    """
+    Batch explanation of many reviews: a `BatchExplanation` (predictions, top-k contributions ranked by absolute value)
+    per chunk of `chunk_size` texts. See `analysis/batch_explanation.py`.
+    """
+    return explain_documents(raw_texts, user_review_model.analyzer, user_review_model.scorer,
+                             top_k=top_k, rank_by=RANK_BY_ABSOLUTE, chunk_size=chunk_size)
+
+def explain_review_analysis(analysis, top_k, display_mode):
+    analyzed = analysis.analyzed
+    nonzero_inds, nonzero_strength_values = get_feature_strengths(analyzed.x, user_review_model.clf_coefficients, display_mode)
+
+    top = np.abs(nonzero_strength_values).argsort(kind='stable')[::-1][:top_k]
+    top_inds = nonzero_inds[top]
+    classes = user_review_model.scorer.classes.tolist()
+    feature_names = user_review_model.feature_names
+    return {
+        'text': analyzed.text,
+        'classes': classes,
+        'probabilities': analysis.probs.tolist(),
+        'prediction': classes[int(analysis.probs[1] > 0.5)],
+        'intercept': float(user_review_model.clf_intercept),
+        'contributions': [[feature_names[i], v] for i, v in zip(top_inds.tolist(), nonzero_strength_values[top].tolist())],
+        'spans': [[start, end, feature_names[i]] for start, end, i in analyzed_feature_spans(analyzed, top_inds)],
+    }
+
+@requires_section('user_review')
 def part1_create_sentiment_prediction_figure(sp_data, top_k=10):
+    return make_sentiment_prediction_figure(sp_data, user_review_model.clf_intercept, top_k=top_k)
+
+@requires_section('user_review')
+def part1_create_sentiment_prediction_chart_data(sp_data):
+    """
+    Everything needed to build the figure of `part1_create_sentiment_prediction_figure` in the browser, for any top-k.
+    See `dash_clientside.sentiment_prediction.figure` in `assets/main.js`.
+    Colors are formatted here, the browser only picks segments, so both build the same figure.
+    """
+    min_val = sp_data['min_val']
+    max_val = sp_data['max_val']
+    return {
+        # (feature, value, marker color) triples
+        'positive_features': [(f, v, sp_marker_color(UI_STYLES.POSITIVE_COLOR, v, min_val, max_val)) for f, v in sp_data['positive_features']],
+        'negative_features': [(f, v, sp_marker_color(UI_STYLES.NEGATIVE_COLOR, v, min_val, max_val)) for f, v in sp_data['negative_features']],
+        'positive_others_color': rgba(*UI_STYLES.POSITIVE_COLOR, SP_OTHERS_OPACITY),
+        'negative_others_color': rgba(*UI_STYLES.NEGATIVE_COLOR, SP_OTHERS_OPACITY),
+        'positive_line_color': rgba(*UI_STYLES.POSITIVE_COLOR),
+        'negative_line_color': rgba(*UI_STYLES.NEGATIVE_COLOR),
+        'intercept_segment': sp_intercept_segment(user_review_model.clf_intercept, min_val, max_val),
+        'layout': figures.layout('stacked_bars', title=SP_FIGURE_TITLE),
+    }
+
+def sp_marker_color(color, value, min_val, max_val):
+    # The stronger the contribution, the more opaque
+    opacity = np.round(map_to_new_low_and_high(abs(value), min_val, max_val, SP_BASE_STRENGTH, 1), 1)
+    return rgba(*color, opacity)
+
+def sp_intercept_segment(clf_intercept, min_val, max_val):
+    clf_intercept = float(clf_intercept)
+    color = UI_STYLES.POSITIVE_COLOR if clf_intercept > 0 else UI_STYLES.NEGATIVE_COLOR
+    return figures.stacked_bar_segment('POSITIVE' if clf_intercept > 0 else 'NEGATIVE', 'INTERCEPT', abs(clf_intercept), True,
+                                       sp_marker_color(color, clf_intercept, min_val, max_val), rgba(*color))
+
+def make_sentiment_prediction_figure(sp_data, clf_intercept, top_k=10):
     ########################################
     # Sentiment Prediction (sp_) Stacked Bar graph
     ########################################
@@ -214,12 +327,8 @@ def part1_create_sentiment_prediction_figure(sp_data, top_k=10):
     if len(positive_features) + len(negative_features) == 0:
         return {}
 
-    clf_intercept = user_review_model.clf_intercept
-
     sp_figure_data = []
 
-    base_strength = 0.3
-
     TOP_K_FEATURES = top_k
 
     top_k_positives = list(reversed(positive_features[-TOP_K_FEATURES:]))
@@ -230,93 +339,67 @@ def part1_create_sentiment_prediction_figure(sp_data, top_k=10):
     rest_negatives = negative_features[TOP_K_FEATURES:]
     total_rest_negative_value = abs(sum([v for _, v in rest_negatives]))
 
-    def __create_bar(name, value, show_text, x, marker_color, line_color): 
-        return go.Bar(
-            x = [x],
-            y = [value],
-            text = name if show_text else None,
-            name = name,
-            textposition='auto',
-            marker= {
-                'color': marker_color,
-                'line': {
-                    'color': line_color,
-                    'width': 1,
-                },
-            }
-        )
+    positive_line_color = rgba(*UI_STYLES.POSITIVE_COLOR)
+    negative_line_color = rgba(*UI_STYLES.NEGATIVE_COLOR)
 
-    def create_positive_bar(name, value, opacity, show_text):
-        return __create_bar(name, value, show_text, 'POSITIVE', rgba(*UI_STYLES.POSITIVE_COLOR, opacity), rgba(*UI_STYLES.POSITIVE_COLOR))
+    def create_positive_bar(name, value, marker_color, show_text):
+        return figures.stacked_bar_segment('POSITIVE', name, value, show_text, marker_color, positive_line_color)
         
-    def create_negative_bar(name, value, opacity, show_text):
-        return __create_bar(name, value, show_text, 'NEGATIVE', rgba(*UI_STYLES.NEGATIVE_COLOR, opacity), rgba(*UI_STYLES.NEGATIVE_COLOR))
+    def create_negative_bar(name, value, marker_color, show_text):
+        return figures.stacked_bar_segment('NEGATIVE', name, value, show_text, marker_color, negative_line_color)
 
     ##################
     # POSITIVE STACKS
     ##################
     for i, (f,v) in enumerate(top_k_positives):
-        relative_strength = np.round(map_to_new_low_and_high(v, min_val, max_val, base_strength, 1), 1)
-        sp_figure_data.append(create_positive_bar(f, v, relative_strength, show_text=(i < 3)))
+        marker_color = sp_marker_color(UI_STYLES.POSITIVE_COLOR, v, min_val, max_val)
+        sp_figure_data.append(create_positive_bar(f, v, marker_color, show_text=(i < 3)))
 
     if len(rest_positives) > 0:
-        sp_figure_data.append(create_positive_bar(f'{len(rest_positives)} others', total_rest_positive_value, 0.1, show_text=True))
+        others_color = rgba(*UI_STYLES.POSITIVE_COLOR, SP_OTHERS_OPACITY)
+        sp_figure_data.append(create_positive_bar(f'{len(rest_positives)} others', total_rest_positive_value, others_color, show_text=True))
     
     ##################
     # NEGATIVE STACKS
     ##################
     for i, (f,v) in enumerate(top_k_negatives):
         v = abs(v)
-        relative_strength = np.round(map_to_new_low_and_high(v, min_val, max_val, base_strength, 1), 1)
-        sp_figure_data.append(create_negative_bar(f, v, relative_strength, show_text=(i < 3)))
+        marker_color = sp_marker_color(UI_STYLES.NEGATIVE_COLOR, v, min_val, max_val)
+        sp_figure_data.append(create_negative_bar(f, v, marker_color, show_text=(i < 3)))
 
     if len(rest_negatives) > 0:
-        sp_figure_data.append(create_negative_bar(f'{len(rest_negatives)} others', total_rest_negative_value, 0.1, show_text=True))
+        others_color = rgba(*UI_STYLES.NEGATIVE_COLOR, SP_OTHERS_OPACITY)
+        sp_figure_data.append(create_negative_bar(f'{len(rest_negatives)} others', total_rest_negative_value, others_color, show_text=True))
 
 
     ##################
     # INTERCEPT
     ##################
-    sp_intercept_bar = None
-    if clf_intercept > 0:
-        opacity = np.round(map_to_new_low_and_high(clf_intercept, min_val, max_val, base_strength, 1), 1)
-        sp_intercept_bar = create_positive_bar('INTERCEPT', clf_intercept, opacity, True)
-    else:
-        opacity = np.round(map_to_new_low_and_high(abs(clf_intercept), min_val, max_val, base_strength, 1), 1)
-        sp_intercept_bar = create_negative_bar('INTERCEPT', abs(clf_intercept), opacity, True)
+    sp_figure_data.append(sp_intercept_segment(clf_intercept, min_val, max_val))
 
-    sp_figure_data.append(sp_intercept_bar)
-
-    sp_stacked_bars_layout = go.Layout(
-        title='Positiveness vs Negativeness',
-        barmode='stack'
-    )
-
-    figure_sp_stacked_bars = go.Figure(data=sp_figure_data, layout=sp_stacked_bars_layout)
-    return figure_sp_stacked_bars
+    return figures.figure(sp_figure_data, figures.layout('stacked_bars', title=SP_FIGURE_TITLE))
 
+@requires_section('user_review')
 def part1_create_feature_in_context(feature, show_k_samples):
     fv = user_review_model.fv
     sentiment = user_review_model.sentiment
-    trainX = user_review_model.trainX
     pred_probs = user_review_model.train_pred_probs
+    postings_index = user_review_model.postings_index
+    feature_stats = user_review_model.feature_stats
 
     feature_ind = fv.vocabulary_[feature]
-    found_in_training_inds = trainX[:, feature_ind].nonzero()[0]
-
-    found_preds = sentiment.trainy[found_in_training_inds]
-    positive_inds = found_in_training_inds[np.where(found_preds == 1)][:show_k_samples]
-    negative_inds = found_in_training_inds[np.where(found_preds == 0)][:show_k_samples]
-
-    num_training_samples = trainX.shape[0]
-    num_appears_in_train_set = len(found_in_training_inds)
+    positive_inds = postings_index.positive_docs(feature_ind)[:show_k_samples]
+    negative_inds = postings_index.negative_docs(feature_ind)[:show_k_samples]
+
+    stats = feature_stats.get(feature_ind)
+    num_training_samples = feature_stats.n_documents
+    num_positives = stats['positive_count']
+    num_negatives = stats['negative_count']
+    num_appears_in_train_set = stats['document_frequency']
     num_not_appear_in_train_set = num_training_samples - num_appears_in_train_set
 
-    num_positives = sum(sentiment.trainy[found_in_training_inds])
-    num_negatives = num_appears_in_train_set - num_positives
 
-
-    pie_trace = go.Pie(
+    pie_trace = figures.pie(
         labels=['Positive context', 'Negative context', 'Not appear'], 
         values=[num_positives, num_negatives, num_not_appear_in_train_set],
         hoverinfo='label+percent', 
@@ -327,11 +410,7 @@ def part1_create_feature_in_context(feature, show_k_samples):
         ),
     )
 
-    pie_layout = go.Layout(
-        title=f"'{feature}' in training data",
-    )
-    
-    pie_figure = go.Figure(data=[pie_trace], layout=pie_layout)
+    pie_figure = figures.figure([pie_trace], figures.layout('pie', title=f"'{feature}' in training data"))
 
     appearance_percent_value = np.round(100*num_appears_in_train_set/num_training_samples, 2)
     appearance_percent_text = f' ({appearance_percent_value}%)' if appearance_percent_value != 0 else ''
@@ -368,44 +447,47 @@ def part1_create_feature_in_context(feature, show_k_samples):
 
 {positive_negative_comparison_text}
     """
+    # Samples are shown lowercased, with `feature` highlighted
+    matcher = FeatureSpanMatcher([feature], user_review_model.analyzer.token_pattern)
+    def get_highlighted_pieces(sample_inds):
+        samples = [sentiment.train_data[ind].lower() for ind in sample_inds]
+        return [split_text_by_spans(sample, matcher.find_spans(sample)) for sample in samples]
+
     return pie_figure, dict(
         md_explaination=md_explaination,
-        positive_samples=[sentiment.train_data[ind] for ind in positive_inds],
-        negative_samples=[sentiment.train_data[ind] for ind in negative_inds],
+        positive_samples=get_highlighted_pieces(positive_inds),
+        negative_samples=get_highlighted_pieces(negative_inds),
         positive_samples_pred_probs = pred_probs[positive_inds],
         negative_samples_pred_probs = pred_probs[negative_inds],
     )
     
 
-def get_information_values_for_top_positive_and_negative_features():
-
-    top_negatives = [
-        ('the worst', 0.555712),
-        ('horrible', 0.195638),
-        ('worst', 0.184547),
-        ('not', 0.183855),
-        ('terrible', 0.100446),
-        ('rude', 0.091172),
-        ('bad', 0.054171),
-        ('asked', 0.034427),
-        ('disappointed', 0.030780),
-        ('slow', 0.030436),
-    ]
-
-    top_positives = [
-        ('great', 0.217689),
-        ('amazing', 0.148440),
-        ('delicious', 0.123200),
-        ('awesome', 0.097469),
-        ('love', 0.094778),
-        ('excellent', 0.092318),
-        ('love this', 0.063266),
-        ('favorite', 0.056707),
-        ('perfect', 0.041055),
-        ('fantastic', 0.036014),
-    ]
-
-    top_positive_iv_bars = go.Bar(
+@requires_section('user_review')
+def part1_get_all_features_table(sort_key, descending=True, top_n=20):
+    """
+    Rows (feature, stats dict) of the `top_n` vocabulary features ranked by `sort_key` (see `feature_stats.SORT_KEYS`).
+    """
+    feature_names = user_review_model.feature_names
+    feature_stats = user_review_model.feature_stats
+    return [(feature_names[ind], feature_stats.get(ind)) for ind in feature_stats.top_features(sort_key, top_n, descending=descending)]
+
+@requires_section('user_review')
+def get_information_values_for_top_positive_and_negative_features(top_k=10):
+    """
+    Bar graphs of the `top_k` features with highest information value (IV) for positive and for negative labeling,
+    computed from the training set (see `analysis/information_value.py`).
+    """
+    feature_names = user_review_model.feature_names
+    information_values = user_review_model.information_values
+
+    def get_top_features(class_index):
+        feature_ids, ivs = information_values.top_features(class_index, top_k)
+        return [(feature_names[ind], float(iv)) for ind, iv in zip(feature_ids, ivs)]
+
+    top_negatives = get_top_features(0)
+    top_positives = get_top_features(1)
+
+    top_positive_iv_bars = figures.bar(
         y = [iv for _, iv in top_positives],
         x = [feature for feature, _ in top_positives],
         name = 'Most informative features for positive',
@@ -418,7 +500,7 @@ def get_information_values_for_top_positive_and_negative_features():
             }
         },
     )
-    top_negative_iv_bars = go.Bar(
+    top_negative_iv_bars = figures.bar(
         y = [iv for _, iv in top_negatives],
         x = [feature for feature, _ in top_negatives],
         name = 'Most informative features for negative labeling',
@@ -431,31 +513,6 @@ def get_information_values_for_top_positive_and_negative_features():
             }
         },
     )
-    top_positive_layout = go.Layout(
-        title="Most informative features (IV) for positive labeling",
-        yaxis=dict(
-            title='IV',
-            automargin=True,
-            fixedrange=True,
-        ),
-        xaxis=dict(
-            automargin=True,
-            fixedrange=True,
-        )
-    )
-    top_negative_layout = go.Layout(
-        title="Most informative features (IV) for negative labeling",
-        yaxis=dict(
-            title='IV',
-            automargin=True,
-            fixedrange=True,
-        ),
-        xaxis=dict(
-            automargin=True,
-            fixedrange=True,
-        )
-    )
-    return go.Figure([top_positive_iv_bars], top_positive_layout), go.Figure([top_negative_iv_bars], top_negative_layout)
-
-
-
+    top_positive_layout = figures.layout('information_value', title="Most informative features (IV) for positive labeling")
+    top_negative_layout = figures.layout('information_value', title="Most informative features (IV) for negative labeling")
+    return figures.figure([top_positive_iv_bars], top_positive_layout), figures.figure([top_negative_iv_bars], top_negative_layout)
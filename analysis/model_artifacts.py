@@ -0,0 +1,254 @@
+"""
+Flat, memory-mappable model artifacts.
+
+The pickled `TfidfVectorizer` / `LogisticRegression` pairs are exported once into a directory of plain numpy arrays
+plus a small json config:
+
+    vocabulary.npy      sorted utf-8 terms (fixed width bytes), for binary search lookups
+    vocabulary_ids.npy  feature index of each sorted term
+    feature_order.npy   position in `vocabulary.npy` of each feature index (i.e. inverse of `vocabulary_ids`)
+    idf.npy             idf vector
+    coef.npy            coefficient matrix (n_coef_rows, n_features)
+    coef_by_feature.npy its feature-major (n_features, n_coef_rows) layout, as scored by `LinearScorer`
+    intercept.npy       intercepts
+    config.json         analyzer config, classes, classifier mode
+
+At load time every array is opened with `np.load(mmap_mode='r')`, so startup does not unpickle anything and
+all gunicorn workers share the same pages through the OS page cache.
+
+To export (run from project root):
+    python -m analysis.model_artifacts
+"""
+import os
+import json
+
+import numpy as np
+import scipy.sparse as sp
+
+from analysis.fused_analyzer import FusedAnalyzer, get_analyzer_config
+from analysis.linear_scoring import get_classifier_mode, probabilities_from_scores
+
+FORMAT_VERSION = 2
+# Version 1 had no `coef_by_feature.npy`, it still loads (with a per-process copy of it)
+SUPPORTED_FORMAT_VERSIONS = [1, 2]
+CONFIG_FILENAME = 'config.json'
+ARRAY_NAMES = ['vocabulary', 'vocabulary_ids', 'feature_order', 'idf', 'coef', 'coef_by_feature', 'intercept']
+
+
+def artifacts_exist(artifact_dir):
+    return os.path.isfile(os.path.join(artifact_dir, CONFIG_FILENAME))
+
+########################################
+# EXPORT
+########################################
+
+def _to_json_value(value):
+    # numpy scalars (e.g. classes_ of int64) are not json serializable
+    return value.item() if isinstance(value, np.generic) else value
+
+def export_model_artifacts(fv, clf, artifact_dir):
+    """
+    Write `fv` (TfidfVectorizer) and `clf` (linear classifier) to `artifact_dir`.
+    """
+    os.makedirs(artifact_dir, exist_ok=True)
+
+    terms = list(fv.vocabulary_.keys())
+    encoded_terms = np.array([t.encode('utf-8') for t in terms], dtype=bytes)
+    term_ids = np.array([fv.vocabulary_[t] for t in terms], dtype=np.int32)
+
+    # utf-8 byte order == unicode code point order, so binary search on bytes matches python's str ordering
+    sorted_order = np.argsort(encoded_terms, kind='mergesort')
+    vocabulary = encoded_terms[sorted_order]
+    vocabulary_ids = term_ids[sorted_order]
+    feature_order = np.empty_like(vocabulary_ids)
+    feature_order[vocabulary_ids] = np.arange(len(vocabulary_ids), dtype=np.int32)
+
+    arrays = {
+        'vocabulary': vocabulary,
+        'vocabulary_ids': vocabulary_ids,
+        'feature_order': feature_order,
+        'idf': np.asarray(fv.idf_, dtype=np.float64),
+        'coef': np.ascontiguousarray(clf.coef_, dtype=np.float64),
+        'coef_by_feature': np.ascontiguousarray(np.asarray(clf.coef_, dtype=np.float64).T),
+        'intercept': np.asarray(clf.intercept_, dtype=np.float64),
+    }
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(artifact_dir, f'{name}.npy'), arrays[name])
+
+    config = {
+        'format_version': FORMAT_VERSION,
+        'analyzer': get_analyzer_config(fv),
+        'classes': [_to_json_value(c) for c in clf.classes_],
+        'classifier_mode': get_classifier_mode(clf),
+    }
+    with open(os.path.join(artifact_dir, CONFIG_FILENAME), 'w') as fout:
+        json.dump(config, fout, indent=2)
+    print("Exported: ", artifact_dir)
+
+########################################
+# LOAD
+########################################
+
+class Vocabulary:
+    """
+    Read-only term -> feature index mapping backed by the memory-mapped sorted term table.
+    Supports the parts of `dict` used in this project (`[]`, `get`, `in`, `len`).
+    """
+    def __init__(self, sorted_terms, sorted_term_ids):
+        self.sorted_terms = sorted_terms
+        self.sorted_term_ids = sorted_term_ids
+        self._max_term_bytes = sorted_terms.dtype.itemsize
+
+    def _position(self, term):
+        if not isinstance(term, str):
+            return -1
+        encoded = term.encode('utf-8')
+        if len(encoded) > self._max_term_bytes:
+            return -1
+        pos = int(np.searchsorted(self.sorted_terms, encoded))
+        if pos < len(self.sorted_terms) and self.sorted_terms[pos] == encoded:
+            return pos
+        return -1
+
+    def get(self, term, default=None):
+        pos = self._position(term)
+        return int(self.sorted_term_ids[pos]) if pos >= 0 else default
+
+    def lookup_many(self, terms):
+        """
+        Vectorized lookup, returns int array of feature indices (-1 for unknown terms).
+        """
+        if len(terms) == 0:
+            return np.empty(0, dtype=np.int64)
+        encoded = np.array([t.encode('utf-8') for t in terms], dtype=bytes)
+        positions = np.searchsorted(self.sorted_terms, encoded)
+        positions[positions >= len(self.sorted_terms)] = 0
+        found = self.sorted_terms[positions] == encoded
+        return np.where(found, self.sorted_term_ids[positions], -1).astype(np.int64)
+
+    def __getitem__(self, term):
+        pos = self._position(term)
+        if pos < 0:
+            raise KeyError(term)
+        return int(self.sorted_term_ids[pos])
+
+    def __contains__(self, term):
+        return self._position(term) >= 0
+
+    def __len__(self):
+        return len(self.sorted_terms)
+
+    def __iter__(self):
+        for term in self.sorted_terms:
+            yield term.decode('utf-8')
+
+
+class FeatureNames:
+    """
+    Read-only list of feature names (index -> term), decoded lazily from the memory-mapped term table.
+    """
+    def __init__(self, sorted_terms, feature_order):
+        self.sorted_terms = sorted_terms
+        self.feature_order = feature_order
+
+    def __getitem__(self, ind):
+        if isinstance(ind, slice):
+            return [self[i] for i in range(*ind.indices(len(self)))]
+        return self.sorted_terms[self.feature_order[ind]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.feature_order)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class ArtifactVectorizer:
+    """
+    Drop-in replacement (for this project's usage) of the fitted `TfidfVectorizer`.
+    """
+    def __init__(self, analyzer_config, vocabulary, vocabulary_ids, feature_order, idf):
+        self.config = analyzer_config
+        self.vocabulary_ = Vocabulary(vocabulary, vocabulary_ids)
+        self.idf_ = idf
+        self.ngram_range = tuple(analyzer_config['ngram_range'])
+        self._feature_names = FeatureNames(vocabulary, feature_order)
+        self.analyzer_ = FusedAnalyzer(analyzer_config, self.vocabulary_, idf)
+
+    def get_feature_names(self):
+        return self._feature_names
+
+    def build_preprocessor(self):
+        return self.analyzer_.preprocess
+
+    def build_tokenizer(self):
+        return self.analyzer_.tokenize
+
+    def build_analyzer(self):
+        analyzer = self.analyzer_
+        return lambda doc: analyzer.analyze_tokens(analyzer.tokenize(analyzer.preprocess(doc)))
+
+    def transform(self, raw_documents):
+        return self.analyzer_.transform(raw_documents)
+
+
+class ArtifactClassifier:
+    """
+    Drop-in replacement (for this project's usage) of the fitted linear classifier.
+    """
+    def __init__(self, coef, intercept, classes, mode, coef_by_feature=None):
+        self.coef_ = coef
+        self.coef_by_feature = coef_by_feature
+        self.intercept_ = intercept
+        self.classes_ = np.array(classes)
+        self.mode = mode
+
+    def decision_function(self, X):
+        if sp.issparse(X):
+            scores = X.dot(np.asarray(self.coef_).T)
+        else:
+            scores = np.dot(np.atleast_2d(X), np.asarray(self.coef_).T)
+        scores = np.asarray(scores) + self.intercept_
+        return scores
+
+    def predict_proba(self, X):
+        return probabilities_from_scores(self.decision_function(X), self.mode)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+def load_model_artifacts(artifact_dir, mmap_mode='r'):
+    """
+    Load (fv, clf) exported by `export_model_artifacts`.
+    """
+    with open(os.path.join(artifact_dir, CONFIG_FILENAME)) as fin:
+        config = json.load(fin)
+    if config['format_version'] not in SUPPORTED_FORMAT_VERSIONS:
+        raise ValueError(f"Unsupported artifact format version: {config['format_version']} (in {artifact_dir})")
+
+    arrays = {
+        name: np.load(os.path.join(artifact_dir, f'{name}.npy'), mmap_mode=mmap_mode)
+        for name in ARRAY_NAMES if os.path.isfile(os.path.join(artifact_dir, f'{name}.npy'))
+    }
+    if 'coef_by_feature' not in arrays:
+        print(f"Old artifact format in {artifact_dir}, re-export (`python -m analysis.model_artifacts`) to share coefficients between workers")
+
+    fv = ArtifactVectorizer(config['analyzer'], arrays['vocabulary'], arrays['vocabulary_ids'], arrays['feature_order'], arrays['idf'])
+    clf = ArtifactClassifier(arrays['coef'], arrays['intercept'], config['classes'], config['classifier_mode'],
+                             coef_by_feature=arrays.get('coef_by_feature'))
+    print("Loaded: ", artifact_dir)
+    return fv, clf
+
+
+if __name__ == '__main__':
+    from analysis.global_vars import MODEL_FILES, load_pickle
+
+    root_dir = os.getcwd()
+    for section, (fv_path, clf_path, artifact_dir) in MODEL_FILES.items():
+        fv_path, clf_path, artifact_dir = [os.path.join(root_dir, p) for p in (fv_path, clf_path, artifact_dir)]
+        if not (os.path.isfile(fv_path) and os.path.isfile(clf_path)):
+            print(f"Skipped {section}: missing {fv_path} or {clf_path}")
+            continue
+        export_model_artifacts(load_pickle(fv_path), load_pickle(clf_path), artifact_dir)
@@ -0,0 +1,75 @@
+"""
+Inverted index: feature id -> sorted ids of training documents containing it, positive and negative kept apart.
+
+Replaces `trainX[:, feature_ind].nonzero()` (a column slice, slow on CSR and proportional to the training set)
+plus masking `trainy`, with an O(postings) read.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+POSITIVE_LABEL = 1
+
+
+class PostingsIndex:
+    """
+    Postings are stored CSR-like: doc ids of feature `f` are `doc_ids[indptr[f]:indptr[f+1]]`, in ascending order.
+    """
+    # Bump when postings are built or stored differently, to invalidate cached indexes
+    VERSION = 1
+
+    def __init__(self, positive_indptr, positive_doc_ids, negative_indptr, negative_doc_ids):
+        self.positive_indptr = positive_indptr
+        self.positive_doc_ids = positive_doc_ids
+        self.negative_indptr = negative_indptr
+        self.negative_doc_ids = negative_doc_ids
+
+    @classmethod
+    def build(cls, X, y):
+        """
+        Build from (n_documents, n_features) matrix `X` and binary labels `y`.
+        """
+        X = sp.csc_matrix(X)
+        X.eliminate_zeros()
+        X.sort_indices()
+        n_features = X.shape[1]
+
+        doc_ids = X.indices.astype(np.int32)
+        feature_ids = np.repeat(np.arange(n_features), np.diff(X.indptr))
+        is_positive = np.asarray(y)[doc_ids] == POSITIVE_LABEL
+
+        def split(mask):
+            # Selecting with a mask keeps the (feature, doc id) order, so postings stay sorted
+            indptr = np.zeros(n_features + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(np.bincount(feature_ids[mask], minlength=n_features))
+            return indptr, doc_ids[mask]
+
+        return cls(*split(is_positive), *split(~is_positive))
+
+    def positive_docs(self, feature_id):
+        return self.positive_doc_ids[self.positive_indptr[feature_id]:self.positive_indptr[feature_id + 1]]
+
+    def negative_docs(self, feature_id):
+        return self.negative_doc_ids[self.negative_indptr[feature_id]:self.negative_indptr[feature_id + 1]]
+
+    @property
+    def positive_counts(self):
+        return np.diff(self.positive_indptr)
+
+    @property
+    def negative_counts(self):
+        return np.diff(self.negative_indptr)
+
+    def to_arrays(self):
+        """
+        For `derived_cache`.
+        """
+        return {
+            'positive_indptr': self.positive_indptr,
+            'positive_doc_ids': self.positive_doc_ids,
+            'negative_indptr': self.negative_indptr,
+            'negative_doc_ids': self.negative_doc_ids,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['positive_indptr'], arrays['positive_doc_ids'], arrays['negative_indptr'], arrays['negative_doc_ids'])
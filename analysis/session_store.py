@@ -0,0 +1,180 @@
+"""
+Optional server-side store for intermediate callback results (e.g. `sp_data`).
+
+Instead of shipping whole results to the browser through `dcc.Store`, and having the browser post them back on every
+chained callback, a callback `put`s the result here and returns only a short handle. Later callbacks `get` it back.
+Entries are stored under a stable key per page view (its session id): each keystroke overwrites the previous result,
+so a page view keeps a single live entry. The handle changes on every `put`, so chained callbacks still fire.
+
+Backends (env `SESSION_STORE_BACKEND`):
+- 'browser' (default): no server-side store, the handle is the value itself, kept in the browser's `dcc.Store`.
+  Works with any number of workers.
+- 'memory': per-process LRU, bounded by entries and bytes. Only valid with a single worker: refuses to start when
+  `WEB_CONCURRENCY` (gunicorn's default worker count) is above 1.
+- 'disk': one json file per entry in `SESSION_STORE_DIR`, shared by all workers of the machine. Pointing it at
+  `/dev/shm/...` keeps it in shared memory. Bounded by entries and bytes too, the oldest files are evicted.
+
+Entries expire `SESSION_STORE_TTL` seconds (default 600) after they were stored. A missing or expired entry gives `None`.
+"""
+import os
+import json
+import time
+import uuid
+import tempfile
+
+from analysis.analysis_cache import LRUCache
+
+
+def _json_default(value):
+    # numpy scalars & arrays
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def serialize(value):
+    return json.dumps(value, default=_json_default).encode('utf-8')
+
+def deserialize(data):
+    return json.loads(data.decode('utf-8'))
+
+def new_key():
+    return uuid.uuid4().hex
+
+def make_handle(key):
+    # A new handle for every put, the entry itself is under `key`
+    return f'{key}:{new_key()[:8]}'
+
+def handle_key(handle):
+    if not isinstance(handle, str):
+        return None
+    return handle.split(':', 1)[0]
+
+
+class BrowserSessionStore:
+    def put(self, key, value):
+        return value
+
+    def get(self, handle):
+        return handle
+
+
+class MemorySessionStore:
+    def __init__(self, max_entries, max_bytes, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes)
+
+    def put(self, key, value):
+        data = serialize(value)
+        self.cache.put(key, (time.time() + self.ttl_seconds, data), len(data))
+        return make_handle(key)
+
+    def get(self, handle):
+        key = handle_key(handle)
+        if key is None:
+            return None
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if time.time() > expires_at:
+            return None
+        return deserialize(data)
+
+
+class DiskSessionStore:
+    # Remove expired files, and evict the oldest ones above bounds, once every this many `put`s (per worker)
+    CLEANUP_INTERVAL = 32
+
+    def __init__(self, directory, max_entries, max_bytes, ttl_seconds):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._puts_since_cleanup = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Keys come back from the browser, only accept what `new_key` produces
+        if not (isinstance(key, str) and len(key) == 32 and all(c in '0123456789abcdef' for c in key)):
+            return None
+        return os.path.join(self.directory, f'{key}.json')
+
+    def put(self, key, value):
+        path = self._path(key)
+        if path is None:
+            # Forged or malformed session id, store under a fresh key instead
+            key = new_key()
+            path = self._path(key)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fout:
+                fout.write(serialize(value))
+            os.replace(tmp_path, path) # atomic, readers never see partial files
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        self._puts_since_cleanup += 1
+        if self._puts_since_cleanup >= self.CLEANUP_INTERVAL:
+            self._puts_since_cleanup = 0
+            self.cleanup()
+        return make_handle(key)
+
+    def get(self, handle):
+        path = self._path(handle_key(handle))
+        if path is None:
+            return None
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl_seconds:
+                return None
+            with open(path, 'rb') as fin:
+                return deserialize(fin.read())
+        except FileNotFoundError:
+            return None
+
+    def cleanup(self):
+        """
+        Remove expired files, then the oldest ones (by mtime) until within `max_entries` and `max_bytes`.
+        """
+        now = time.time()
+        files = []
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl_seconds:
+                    os.remove(entry.path)
+                else:
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                pass # removed by another worker
+
+        files.sort(reverse=True) # newest first
+        n_entries = total_bytes = 0
+        for _, size, path in files:
+            n_entries += 1
+            total_bytes += size
+            if n_entries > self.max_entries or total_bytes > self.max_bytes:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def create_session_store():
+    backend = os.environ.get('SESSION_STORE_BACKEND', 'browser')
+    ttl_seconds = float(os.environ.get('SESSION_STORE_TTL', 600))
+    max_entries = int(os.environ.get('SESSION_STORE_MAX_ENTRIES', 4096))
+    max_bytes = int(float(os.environ.get('SESSION_STORE_MAX_MB', 64)) * 1024 * 1024)
+    if backend == 'browser':
+        return BrowserSessionStore()
+    if backend == 'memory':
+        if int(os.environ.get('WEB_CONCURRENCY', 1)) > 1:
+            raise ValueError('SESSION_STORE_BACKEND=memory is per process, use `disk` (or `browser`) with several workers.')
+        return MemorySessionStore(max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    if backend == 'disk':
+        directory = os.environ.get('SESSION_STORE_DIR', os.path.join(tempfile.gettempdir(), 'model-explanation-sessions'))
+        return DiskSessionStore(directory, max_entries=max_entries, max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+    raise ValueError(f'Invalid SESSION_STORE_BACKEND: {backend!r}')
+
+session_store = create_session_store()
@@ -0,0 +1,99 @@
+"""
+Span-aligned attribution: exact char offsets of n-gram features in a text, for highlighting.
+
+Replaces building a regex alternation out of feature names (unescaped, compiled per request, and scanning the text
+once per `findall`/`split`). Two sources of spans, both linear in text length:
+
+- `analyzed_feature_spans`: for input texts, reuses the offsets `FusedAnalyzer` already computed.
+- `FeatureSpanMatcher`: for arbitrary texts (e.g. training samples), a token-level trie over the wanted features,
+  matched against the tokens found by the vectorizer's `token_pattern`.
+
+When matches overlap, the leftmost (then longest) match wins, and the others are dropped.
+"""
+import numpy as np
+
+
+def select_non_overlapping(spans):
+    """
+    Leftmost-longest non-overlapping subset of (start, end, feature) `spans`, sorted by start.
+    """
+    selected = []
+    last_end = -1
+    for start, end, feature in sorted(spans, key=lambda span: (span[0], -span[1])):
+        if start >= last_end:
+            selected.append((start, end, feature))
+            last_end = end
+    return selected
+
+def analyzed_feature_spans(analyzed, feature_ids):
+    """
+    (start, end, feature id) spans in `analyzed.text` of occurrences of `feature_ids`, from an `AnalyzedText`.
+    """
+    if len(analyzed.feature_ids) == 0:
+        return []
+    wanted = np.isin(analyzed.feature_ids, np.asarray(list(feature_ids), dtype=np.int64))
+    starts, ends = analyzed.feature_char_spans
+    return select_non_overlapping(zip(starts[wanted].tolist(), ends[wanted].tolist(), analyzed.feature_ids[wanted].tolist()))
+
+def split_text_by_spans(text, spans):
+    """
+    Cut `text` into pieces [(substring, feature or None)], where pieces with a feature are the (sorted, non-overlapping)
+    `spans`. Joining all substrings gives back `text`.
+    """
+    pieces = []
+    position = 0
+    for start, end, feature in spans:
+        if start > position:
+            pieces.append((text[position:start], None))
+        pieces.append((text[start:end], feature))
+        position = end
+    if position < len(text):
+        pieces.append((text[position:], None))
+    return pieces
+
+
+class FeatureSpanMatcher:
+    """
+    Token-level trie over n-gram `features` (tokens joined by single space, as in the vocabulary).
+
+    `find_spans` walks the trie from each token of the text, so the cost is O(number of tokens * max n-gram length),
+    independent of the number of features. Tokens are found with `token_pattern` (compiled regex), which should be
+    the vectorizer's one; preprocessing beyond lowercasing (e.g. apostrophe expansion) is not reproduced, so matches
+    are on the text as displayed.
+    """
+    _END = object() # trie key marking "a feature ends here"
+
+    def __init__(self, features, token_pattern):
+        self.token_pattern = token_pattern
+        self.trie = {}
+        for feature in features:
+            node = self.trie
+            for token in feature.split(' '):
+                node = node.setdefault(token, {})
+            node[self._END] = feature
+
+    def find_spans(self, text):
+        """
+        Leftmost-longest, non-overlapping (start, end, feature) spans of the features in `text`.
+        """
+        matches = list(self.token_pattern.finditer(text))
+        spans = []
+        i = 0
+        while i < len(matches):
+            node = self.trie
+            longest = None
+            j = i
+            while j < len(matches):
+                node = node.get(matches[j].group(), None)
+                if node is None:
+                    break
+                j += 1
+                if self._END in node:
+                    longest = (j, node[self._END])
+            if longest is None:
+                i += 1
+                continue
+            j, feature = longest
+            spans.append((matches[i].start(), matches[j - 1].end(), feature))
+            i = j
+        return spans
@@ -0,0 +1,118 @@
+"""
+JSON HTTP API on the Flask server, for calling the models from other services (no Dash, no figures).
+
+    POST /api/review/explain    {"text": "..."} or {"texts": ["...", ...]}, optional "top_k", "display_mode"
+    POST /api/news/explain      same, plus optional "category" (default: the predicted one)
+
+A single "text" gives one result object, "texts" gives {"results": [...]} in the same order (analyzed as one batch).
+See `explain_review` and `explain_news` for the fields of a result. Invalid requests get 400 with {"error": "..."}.
+
+    GET /api/news/informative_features?category=...&top_k=10
+                                [feature, information value] of the features most informative for a news category
+    GET /api/stats              micro-batching metrics (batch sizes, queue delays), see `analysis/micro_batching.py`
+"""
+import os
+
+from flask import jsonify, request
+
+from analysis import model_analysis_user_review, model_analysis_news, global_vars
+from analysis.analysis_cache import get_micro_batching_stats
+from analysis.global_vars import news_model
+from analysis.model_analysis_user_review import FeatureDisplayMode
+
+API_MAX_DOCUMENTS = int(os.environ.get('API_MAX_DOCUMENTS', 1000))
+API_MAX_TOP_K = 100
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def parse_documents(body):
+    """
+    (texts, is_batch) of a request body.
+    """
+    if 'text' in body:
+        texts, is_batch = [body['text']], False
+    elif 'texts' in body:
+        texts, is_batch = body['texts'], True
+        if not isinstance(texts, list):
+            raise BadRequest('"texts" must be a list of strings.')
+        if len(texts) > API_MAX_DOCUMENTS:
+            raise BadRequest(f'At most {API_MAX_DOCUMENTS} texts per request.')
+    else:
+        raise BadRequest('Expected "text" or "texts".')
+
+    if not all(isinstance(text, str) for text in texts):
+        raise BadRequest('Texts must be strings.')
+    return texts, is_batch
+
+def parse_top_k(top_k):
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or not 0 < top_k <= API_MAX_TOP_K:
+        raise BadRequest(f'"top_k" must be an integer in [1, {API_MAX_TOP_K}].')
+    return top_k
+
+def parse_category(category):
+    global_vars.ensure_section_loaded('news')
+    if not isinstance(category, str) or category not in news_model.class_to_index:
+        raise BadRequest(f'"category" must be one of: {", ".join(news_model.class_to_index)}.')
+    return category
+
+def parse_options(body):
+    top_k = parse_top_k(body.get('top_k', 10))
+    try:
+        display_mode = FeatureDisplayMode(body.get('display_mode', FeatureDisplayMode.prediction_contribution.value))
+    except ValueError:
+        raise BadRequest(f'"display_mode" must be one of: {", ".join(mode.value for mode in FeatureDisplayMode)}.')
+    return {'top_k': top_k, 'display_mode': display_mode}
+
+def parse_news_options(body):
+    options = parse_options(body)
+    if body.get('category') is not None:
+        options['category'] = parse_category(body['category'])
+    return options
+
+def explain_request(explain_fn, explain_batch_fn, parse_options_fn=parse_options):
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise BadRequest('Expected a JSON object body.')
+    texts, is_batch = parse_documents(body)
+    options = parse_options_fn(body)
+
+    if is_batch:
+        return jsonify({'results': explain_batch_fn(texts, **options)})
+    return jsonify(explain_fn(texts[0], **options))
+
+
+def register_routes(server):
+    """
+    Add the API routes to Flask `server` (`app.server`).
+    """
+    @server.errorhandler(BadRequest)
+    def on_bad_request(error):
+        return jsonify({'error': str(error)}), 400
+
+    @server.route('/api/review/explain', methods=['POST'])
+    def api_review_explain():
+        return explain_request(model_analysis_user_review.explain_review, model_analysis_user_review.explain_reviews)
+
+    @server.route('/api/news/explain', methods=['POST'])
+    def api_news_explain():
+        return explain_request(model_analysis_news.explain_news, model_analysis_news.explain_news_batch, parse_options_fn=parse_news_options)
+
+    @server.route('/api/news/informative_features', methods=['GET'])
+    def api_news_informative_features():
+        category = parse_category(request.args.get('category'))
+        try:
+            top_k = int(request.args.get('top_k', 10))
+        except ValueError:
+            top_k = None
+        top_k = parse_top_k(top_k)
+        return jsonify({
+            'category': category,
+            'features': model_analysis_news.get_most_informative_features(category, top_k=top_k),
+        })
+
+    @server.route('/api/stats', methods=['GET'])
+    def api_stats():
+        return jsonify({'micro_batching': get_micro_batching_stats()})
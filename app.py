@@ -1,3 +1,5 @@
+import os
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
@@ -6,6 +8,7 @@ from dash.dependencies import Input, Output
 from enum import Enum
 
 from analysis import global_vars
+import api
 
 from components.UserReviewComponent import UserReviewComponent
 from components.NewsClassificationComponent import NewsClassificationComponent
@@ -38,8 +41,30 @@ class Page(Enum):
         else:
             raise ValueError('Invalid value')
 
+    @property
+    def section(self):
+        """
+        Name of the model section (see `global_vars.sections`) this page needs.
+        """
+        if self == Page.UserReview:
+            return 'user_review'
+        elif self == Page.NewsClassification:
+            return 'news'
+        else:
+            raise ValueError('Invalid value')
+
+    @property
+    def is_ready(self):
+        return global_vars.sections[self.section].is_loaded
+
     @property
     def content(self):
+        section = global_vars.sections[self.section]
+        if not section.is_loaded:
+            # Load in background, page is re-rendered by `page-loading-interval` once ready
+            section.load_in_background()
+            return self.loading_content
+
         if self == Page.UserReview:
             return UserReviewComponent().render()
         elif self == Page.NewsClassification:
@@ -47,6 +72,15 @@ class Page(Enum):
         else:
             raise ValueError('Invalid value')
 
+    @property
+    def loading_content(self):
+        error = global_vars.sections[self.section].error
+        if error is not None:
+            return html.Div(f'Failed to load model: {error}', className='ui negative message')
+        return html.Div([
+            html.Div('Loading model...', className='ui active centered inline text loader'),
+        ], style={'padding': '60px'})
+
 
 pages = [Page.UserReview, Page.NewsClassification]
 
@@ -63,8 +97,11 @@ app = dash.Dash(
 
 app.config['suppress_callback_exceptions'] = True
 
-global_vars.initialize_global_vars_for_user_review_section()
-global_vars.initialize_global_vars_for_news_section()
+# Model sections are loaded lazily, the first time a page (or a callback) needs them. See `global_vars.sections`.
+# In preload mode (`gunicorn --preload`, see `start-server.sh`), everything is loaded once in the master process instead,
+# and shared copy-on-write with the forked workers.
+if os.environ.get('PRELOAD_MODELS', '0') == '1':
+    global_vars.preload_all_sections()
 
 # Root of all views
 root_layout = html.Div([
@@ -83,21 +120,39 @@ root_layout = html.Div([
     ])),
 
     html.Div(id='page-content', style={'padding-top': '30px'}),
+
+    # Polls while the current page's model is still loading
+    dcc.Interval(id='page-loading-interval', interval=500, disabled=True),
 ])
 
 # Link Tab to URL & Content (page content, url's pathname)
 @app.callback(
-    Output('page-content', 'children'), 
-    [Input('tabs', 'value')]
+    [
+        Output('page-content', 'children'),
+        Output('page-loading-interval', 'disabled'),
+    ],
+    [
+        Input('tabs', 'value'),
+        Input('page-loading-interval', 'n_intervals'),
+    ]
 )
-def display_page(tab_value):
+def display_page(tab_value, n_intervals):
     try:
         page = Page(tab_value)
     except ValueError as e:
         # Default page
         page = Page.UserReview
         print("Invalid Page/Tab Encountered:", e, "...Redirect to UserReview")
-    return page.content
+
+    section = global_vars.sections[page.section]
+    is_polling = any(t['prop_id'] == 'page-loading-interval.n_intervals' for t in dash.callback_context.triggered)
+    if is_polling and section.is_loading:
+        # Still loading, keep the loading state as is
+        return dash.no_update, False
+
+    # Keep polling until the page's section is ready (or failed)
+    is_done = page.is_ready or section.error is not None
+    return page.content, is_done
 
 # Here we try to map url to tab, but result in circular dependency ... So just don't support other url path for now.
 # @app.callback(
@@ -122,6 +177,9 @@ NewsClassificationComponent().register_callbacks(app)
 
 # Server when deploy* (see `Procfile`)
 server = app.server
+
+# JSON prediction & explanation API, see `api.py`
+api.register_routes(server)
 PORT = 3000
 
 if __name__ == '__main__':
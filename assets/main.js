@@ -7,4 +7,82 @@ $(window).on('load', function() {
             }, 100);
         });
     }, 500);
-})
\ No newline at end of file
+})
+
+/**
+ * Dash clientside callbacks (`app.clientside_callback` with `ClientsideFunction(namespace, function_name)`).
+ */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    sentiment_prediction: {
+        /**
+         * Same figure as `part1_create_sentiment_prediction_figure` (analysis/model_analysis_user_review.py),
+         * from the data of `part1_create_sentiment_prediction_chart_data`, so changing top-k needs no server round trip.
+         */
+        figure: function(chartData, topK) {
+            if (!chartData) {
+                return {};
+            }
+            var positiveFeatures = chartData.positive_features;
+            var negativeFeatures = chartData.negative_features;
+            if (positiveFeatures.length + negativeFeatures.length === 0) {
+                return {};
+            }
+
+            function sum(features) {
+                var total = 0;
+                for (var i = 0; i < features.length; i++) {
+                    total += features[i][1];
+                }
+                return total;
+            }
+
+            // See `figures.stacked_bar_segment`. Colors come formatted from the server, the same strings as its figure.
+            function segment(x, name, value, showText, markerColor, lineColor) {
+                var bar = {
+                    type: 'bar',
+                    x: [x],
+                    y: [value],
+                    name: name,
+                    marker: {color: markerColor, line: {color: lineColor}},
+                };
+                if (showText) {
+                    bar.text = name;
+                }
+                return bar;
+            }
+
+            var data = [];
+
+            // POSITIVE STACKS
+            var topKPositives = positiveFeatures.slice(-topK).reverse();
+            var restPositives = positiveFeatures.slice(0, -topK);
+            topKPositives.forEach(function(feature, i) {
+                data.push(segment('POSITIVE', feature[0], feature[1], i < 3, feature[2], chartData.positive_line_color));
+            });
+            if (restPositives.length > 0) {
+                data.push(segment('POSITIVE', restPositives.length + ' others', sum(restPositives), true,
+                                  chartData.positive_others_color, chartData.positive_line_color));
+            }
+
+            // NEGATIVE STACKS
+            var topKNegatives = negativeFeatures.slice(0, topK);
+            var restNegatives = negativeFeatures.slice(topK);
+            topKNegatives.forEach(function(feature, i) {
+                data.push(segment('NEGATIVE', feature[0], Math.abs(feature[1]), i < 3, feature[2], chartData.negative_line_color));
+            });
+            if (restNegatives.length > 0) {
+                data.push(segment('NEGATIVE', restNegatives.length + ' others', Math.abs(sum(restNegatives)), true,
+                                  chartData.negative_others_color, chartData.negative_line_color));
+            }
+
+            // INTERCEPT
+            data.push(chartData.intercept_segment);
+
+            return {data: data, layout: chartData.layout};
+        },
+
+        topKLabel: function(topK) {
+            return 'Show Top-' + topK + ' features';
+        },
+    },
+});
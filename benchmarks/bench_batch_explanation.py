@@ -0,0 +1,100 @@
+"""
+Benchmark: per-document explanation loop vs. `explain_documents` (batch engine), on synthetic reviews.
+
+Checks both rank the same contributions, then reports throughput for 100k documents and peak memory for a few chunk
+sizes. Run from project root:
+    python -m benchmarks.bench_batch_explanation
+"""
+import time
+import tracemalloc
+
+import numpy as np
+
+from analysis.batch_explanation import explain_documents, RANK_BY_ABSOLUTE
+from analysis.fused_analyzer import FusedAnalyzer
+from analysis.linear_scoring import LinearScorer
+
+N_DOCUMENTS = 100000
+N_LOOP_DOCUMENTS = 5000
+WORDS_PER_DOCUMENT = 60
+VOCABULARY_WORDS = 5000
+TOP_K = 10
+CHUNK_SIZES = [1000, 10000, 50000]
+
+ANALYZER_CONFIG = {
+    'preprocessor': {'type': 'default'},
+    'lowercase': True,
+    'strip_accents': None,
+    'token_pattern': r"(?u)\b\w\w+\b",
+    'ngram_range': [1, 2],
+    'stop_words': None,
+    'binary': False,
+    'norm': 'l2',
+    'use_idf': True,
+    'smooth_idf': True,
+    'sublinear_tf': False,
+}
+
+
+def make_model(words, rng):
+    vocabulary = {}
+    for i, word in enumerate(words):
+        vocabulary.setdefault(word, len(vocabulary))
+        vocabulary.setdefault(f'{words[i - 1]} {word}', len(vocabulary))
+    analyzer = FusedAnalyzer(ANALYZER_CONFIG, vocabulary, 1 + rng.rand(len(vocabulary)))
+    scorer = LinearScorer(rng.randn(1, len(vocabulary)), [0.1], [0, 1], 'binary')
+    return analyzer, scorer
+
+def loop_explain(documents, analyzer, scorer):
+    """
+    One document at a time, as the UI path does.
+    """
+    results = []
+    for document in documents:
+        x = analyzer.analyze(document).x
+        probs = scorer.predict_proba_row(x.indices, x.data)
+        contributions = scorer.contributions_row(x.indices, x.data)[:, 0]
+        top = np.abs(contributions).argsort(kind='stable')[::-1][:TOP_K]
+        results.append((probs, x.indices[top], contributions[top]))
+    return results
+
+def main():
+    rng = np.random.RandomState(0)
+    words = [f'word{i}' for i in range(VOCABULARY_WORDS)]
+    analyzer, scorer = make_model(words, rng)
+    documents = [' '.join(rng.choice(words, WORDS_PER_DOCUMENT)) for _ in range(N_DOCUMENTS)]
+
+    # Same results (ties aside, contributions are random floats)
+    loop_results = loop_explain(documents[:N_LOOP_DOCUMENTS], analyzer, scorer)
+    batch = next(explain_documents(documents[:N_LOOP_DOCUMENTS], analyzer, scorer, top_k=TOP_K, rank_by=RANK_BY_ABSOLUTE,
+                                   chunk_size=N_LOOP_DOCUMENTS))
+    for i, (probs, feature_ids, contributions) in enumerate(loop_results):
+        assert np.allclose(batch.probs[i], probs)
+        assert np.array_equal(batch.top_feature_ids[i, :len(feature_ids)], feature_ids)
+        assert np.allclose(batch.top_contributions[i, :len(feature_ids)], contributions)
+
+    started_at = time.perf_counter()
+    loop_explain(documents[:N_LOOP_DOCUMENTS], analyzer, scorer)
+    loop_docs_per_second = N_LOOP_DOCUMENTS / (time.perf_counter() - started_at)
+    print(f'per-document loop: {loop_docs_per_second:>10.0f} docs/sec')
+
+    print(f"{'chunk size':>10} | {'seconds':>8} | {'docs/sec':>10} | {'peak MB (2 chunks)':>18}")
+    for chunk_size in CHUNK_SIZES:
+        started_at = time.perf_counter()
+        n_explained = sum(len(batch) for batch in explain_documents(
+            documents, analyzer, scorer, top_k=TOP_K, rank_by=RANK_BY_ABSOLUTE, chunk_size=chunk_size))
+        seconds = time.perf_counter() - started_at
+        assert n_explained == N_DOCUMENTS
+
+        # tracemalloc slows allocations down a lot, so measure memory separately, over two chunks
+        tracemalloc.start()
+        for _ in explain_documents(documents[:2 * chunk_size], analyzer, scorer, top_k=TOP_K, rank_by=RANK_BY_ABSOLUTE,
+                                   chunk_size=chunk_size):
+            pass
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{chunk_size:>10} | {seconds:>8.2f} | {N_DOCUMENTS / seconds:>10.0f} | {peak_bytes / 1024 ** 2:>18.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: `parse_quoted_line` (bytes fast path) vs. `parse_quoted_line_reference` (`ast.literal_eval`, as the news
+dataset loader originally did with `eval`), on every line of the news dataset.
+
+Checks both give the same value for every line, then reports how many lines take the fast path and the parsing time
+per member. Run from project root:
+    python -m benchmarks.bench_corpus_parsing
+"""
+import os
+import time
+import tarfile
+
+from analysis import corpus_store
+from analysis.corpus_store import NEWS_DATASET_MEMBERS, parse_quoted_line, parse_quoted_line_reference
+
+NEWS_DATASET_PATH = 'assets/model_news/news_dataset.tar.gz'
+
+
+def read_member_lines(tarfname, member_name):
+    with tarfile.open(tarfname, "r:gz") as tar:
+        return tar.extractfile(tar.getmember(member_name)).readlines()
+
+def time_parse(parse_fn, lines):
+    started_at = time.perf_counter()
+    for line in lines:
+        parse_fn(line)
+    return time.perf_counter() - started_at
+
+def count_fast_path(lines):
+    # Lines `parse_quoted_line` answers without falling back to the reference
+    n_fallbacks = 0
+    def counting_reference(line):
+        nonlocal n_fallbacks
+        n_fallbacks += 1
+        return parse_quoted_line_reference(line)
+
+    corpus_store.parse_quoted_line_reference = counting_reference
+    try:
+        for line in lines:
+            parse_quoted_line(line)
+    finally:
+        corpus_store.parse_quoted_line_reference = parse_quoted_line_reference
+    return len(lines) - n_fallbacks
+
+def main():
+    tarfname = os.path.join(os.getcwd(), NEWS_DATASET_PATH)
+    print(f"{'member':>14} | {'lines':>7} | {'fast path':>9} | {'reference s':>11} | {'parse s':>8} | {'speedup':>8}")
+    for name, member_name in NEWS_DATASET_MEMBERS.items():
+        lines = read_member_lines(tarfname, member_name)
+        for line in lines:
+            assert parse_quoted_line(line) == parse_quoted_line_reference(line), line[:80]
+
+        reference_seconds = time_parse(parse_quoted_line_reference, lines)
+        parse_seconds = time_parse(parse_quoted_line, lines)
+        print(f'{name:>14} | {len(lines):>7} | {count_fast_path(lines):>9} | {reference_seconds:>11.3f} | '
+              f'{parse_seconds:>8.3f} | {reference_seconds / parse_seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
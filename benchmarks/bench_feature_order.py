@@ -0,0 +1,63 @@
+"""
+Benchmark: previous `sort_features_human_friendly_order` (every token against every remaining feature) vs. the
+current one (token position lookup + sort), on synthetic texts of 10 to 10,000 tokens.
+
+Checks both give the same order, then reports the time per call. Run from project root:
+    python -m benchmarks.bench_feature_order
+"""
+import random
+import time
+
+from analysis.model_analysis_user_review import sort_features_human_friendly_order
+
+N_TOKENS = [10, 100, 1000, 10000]
+VOCABULARY_WORDS = 2000
+# Fraction of the text's unigrams & bigrams detected as features (the rest are not in the vocabulary)
+FEATURE_FRACTION = 0.3
+
+
+def previous_sort_features_human_friendly_order(tokens, features):
+    preferred_ordered_features = []
+    features = sorted(features, key=len, reverse=True)
+    for token in tokens:
+        for feature in reversed(features):
+            if feature.startswith(token):
+                preferred_ordered_features.append(feature)
+                features.remove(feature)
+    return preferred_ordered_features
+
+def make_input(n_tokens, rng):
+    # Words sharing prefixes ('good', 'goodness', ...) so that tokens can be string prefixes of other features
+    stems = [f'w{i}' for i in range(VOCABULARY_WORDS // 2)]
+    words = stems + [stem + 'x' for stem in stems]
+    tokens = [rng.choice(words) for _ in range(n_tokens)]
+    ngrams = set(tokens) | {f'{a} {b}' for a, b in zip(tokens, tokens[1:])}
+    features = [ngram for ngram in sorted(ngrams) if rng.random() < FEATURE_FRACTION]
+    rng.shuffle(features)
+    return tokens, features
+
+def time_call(fn, tokens, features, min_seconds=0.2):
+    n_calls = 0
+    started_at = time.perf_counter()
+    while True:
+        fn(tokens, features)
+        n_calls += 1
+        seconds = time.perf_counter() - started_at
+        if seconds >= min_seconds:
+            return seconds / n_calls
+
+def main():
+    rng = random.Random(0)
+    print(f"{'tokens':>8} | {'features':>8} | {'previous ms':>12} | {'current ms':>10} | {'speedup':>8}")
+    for n_tokens in N_TOKENS:
+        tokens, features = make_input(n_tokens, rng)
+        assert sort_features_human_friendly_order(tokens, features) == previous_sort_features_human_friendly_order(tokens, features)
+
+        previous_seconds = time_call(previous_sort_features_human_friendly_order, tokens, features)
+        current_seconds = time_call(sort_features_human_friendly_order, tokens, features)
+        print(f'{n_tokens:>8} | {len(features):>8} | {1e3 * previous_seconds:>12.3f} | {1e3 * current_seconds:>10.3f} | '
+              f'{previous_seconds / current_seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: sentiment prediction stacked bar chart built with plotly `graph_objs` vs. `analysis.figures` dicts.
+
+Reports build time and serialized payload size (as sent by Dash) for growing top-k, and checks the dicts serialize
+exactly as plotly's own `to_plotly_json()` of the same figure (apart from the random `uid` graph_objs gives each
+trace). Run from project root:
+    python -m benchmarks.bench_figure_builder
+"""
+import json
+import timeit
+
+import numpy as np
+import plotly.graph_objs as go
+from plotly.utils import PlotlyJSONEncoder
+
+from analysis.global_vars import UI_STYLES
+from analysis.misc import rgba, map_to_new_low_and_high
+from analysis.model_analysis_user_review import make_sentiment_prediction_figure
+
+TOP_KS = [10, 100, 1000, 5000]
+INTERCEPT = -2.1357
+
+
+def graph_objs_sentiment_prediction_figure(sp_data, clf_intercept, top_k):
+    """
+    Same figure with validated `go.Bar` segments, trace defaults in the layout template as in `analysis.figures`.
+    """
+    positive_features = sp_data['positive_features']
+    negative_features = sp_data['negative_features']
+    min_val = sp_data['min_val']
+    max_val = sp_data['max_val']
+    base_strength = 0.3
+
+    top_k_positives = list(reversed(positive_features[-top_k:]))
+    rest_positives = positive_features[:-top_k]
+    top_k_negatives = list(negative_features[:top_k])
+    rest_negatives = negative_features[top_k:]
+
+    def create_bar(name, value, show_text, x, color):
+        return go.Bar(x=[x], y=[value], text=name if show_text else None, name=name,
+                      marker={'color': color[0], 'line': {'color': color[1]}})
+
+    def positive_color(opacity):
+        return rgba(*UI_STYLES.POSITIVE_COLOR, opacity), rgba(*UI_STYLES.POSITIVE_COLOR)
+
+    def negative_color(opacity):
+        return rgba(*UI_STYLES.NEGATIVE_COLOR, opacity), rgba(*UI_STYLES.NEGATIVE_COLOR)
+
+    data = []
+    for i, (f, v) in enumerate(top_k_positives):
+        data.append(create_bar(f, v, i < 3, 'POSITIVE', positive_color(np.round(map_to_new_low_and_high(v, min_val, max_val, base_strength, 1), 1))))
+    if len(rest_positives) > 0:
+        data.append(create_bar(f'{len(rest_positives)} others', sum([v for _, v in rest_positives]), True, 'POSITIVE', positive_color(0.1)))
+    for i, (f, v) in enumerate(top_k_negatives):
+        v = abs(v)
+        data.append(create_bar(f, v, i < 3, 'NEGATIVE', negative_color(np.round(map_to_new_low_and_high(v, min_val, max_val, base_strength, 1), 1))))
+    if len(rest_negatives) > 0:
+        data.append(create_bar(f'{len(rest_negatives)} others', abs(sum([v for _, v in rest_negatives])), True, 'NEGATIVE', negative_color(0.1)))
+
+    if clf_intercept > 0:
+        opacity = np.round(map_to_new_low_and_high(clf_intercept, min_val, max_val, base_strength, 1), 1)
+        data.append(create_bar('INTERCEPT', clf_intercept, True, 'POSITIVE', positive_color(opacity)))
+    else:
+        opacity = np.round(map_to_new_low_and_high(abs(clf_intercept), min_val, max_val, base_strength, 1), 1)
+        data.append(create_bar('INTERCEPT', abs(clf_intercept), True, 'NEGATIVE', negative_color(opacity)))
+
+    template = {'data': {'bar': [go.Bar(textposition='auto', marker={'line': {'width': 1}})]}}
+    layout = go.Layout(title={'text': 'Positiveness vs Negativeness'}, barmode='stack', template=template)
+    return go.Figure(data=data, layout=layout)
+
+def make_sp_data(n_features, rng):
+    positive_values = np.sort(rng.rand(n_features))
+    negative_values = -np.sort(rng.rand(n_features))[::-1]
+    all_values = np.abs(np.concatenate([positive_values, negative_values]))
+    return {
+        'positive_features': [(f'positive feature {i}', v) for i, v in enumerate(positive_values)],
+        'negative_features': [(f'negative feature {i}', v) for i, v in enumerate(negative_values)],
+        'min_val': all_values.min(),
+        'max_val': all_values.max(),
+    }
+
+def serialize(fig):
+    return json.dumps(fig, cls=PlotlyJSONEncoder)
+
+def assert_same_as_plotly(figure, plotly_figure):
+    figure = json.loads(serialize(figure))
+    plotly_figure = json.loads(serialize(plotly_figure))
+    assert figure['layout'] == plotly_figure['layout']
+    assert len(figure['data']) == len(plotly_figure['data'])
+    for trace, plotly_trace in zip(figure['data'], plotly_figure['data']):
+        # graph_objs gives every trace a random uid, plotly.js makes one up when it's missing
+        assert isinstance(plotly_trace.pop('uid'), str)
+        assert trace == plotly_trace
+
+def main():
+    rng = np.random.RandomState(0)
+    n_repeats = 5
+
+    print(f"{'top-k':>6} {'traces':>7} | {'graph_objs ms':>13} {'KB':>8} | {'dicts ms':>9} {'KB':>8} | {'speedup':>8}")
+    for top_k in TOP_KS:
+        sp_data = make_sp_data(top_k * 2, rng)
+
+        old_figure = graph_objs_sentiment_prediction_figure(sp_data, INTERCEPT, top_k)
+        new_figure = make_sentiment_prediction_figure(sp_data, INTERCEPT, top_k=top_k)
+        assert_same_as_plotly(new_figure, old_figure)
+
+        old_seconds = min(timeit.repeat(lambda: serialize(graph_objs_sentiment_prediction_figure(sp_data, INTERCEPT, top_k)), number=1, repeat=n_repeats))
+        new_seconds = min(timeit.repeat(lambda: serialize(make_sentiment_prediction_figure(sp_data, INTERCEPT, top_k=top_k)), number=1, repeat=n_repeats))
+        old_kb = len(serialize(old_figure)) / 1024
+        new_kb = len(serialize(new_figure)) / 1024
+        print(f"{top_k:>6} {len(new_figure['data']):>7} | {old_seconds * 1e3:>13.1f} {old_kb:>8.1f} | "
+              f"{new_seconds * 1e3:>9.1f} {new_kb:>8.1f} | {old_seconds / new_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark: `FusedAnalyzer.analyze` from scratch vs. `IncrementalAnalyzer.update`, for a one-word edit.
+
+Edits a word at the end and in the middle of documents of growing length, and checks both give the same
+`AnalyzedText`. Run from project root:
+    python -m benchmarks.bench_incremental_analysis
+"""
+import timeit
+
+import numpy as np
+
+from analysis.fused_analyzer import FusedAnalyzer
+from analysis.incremental_analyzer import IncrementalAnalyzer
+
+DOCUMENT_LENGTHS = [100, 1000, 10000, 100000]
+VOCABULARY_WORDS = 2000
+N_REPEATS = 20
+
+ANALYZER_CONFIG = {
+    'preprocessor': {'type': 'text_preprocessor', 'expand_apostrophe': True},
+    'lowercase': True,
+    'strip_accents': None,
+    'token_pattern': r"(?u)\b\w\w+\b",
+    'ngram_range': [1, 2],
+    'stop_words': None,
+    'binary': False,
+    'norm': 'l2',
+    'use_idf': True,
+    'smooth_idf': True,
+    'sublinear_tf': False,
+}
+
+
+def make_analyzer(words, rng):
+    vocabulary = {}
+    for i, word in enumerate(words):
+        vocabulary.setdefault(word, len(vocabulary))
+        vocabulary.setdefault(f'{word} {words[i - 1]}', len(vocabulary))
+    return FusedAnalyzer(ANALYZER_CONFIG, vocabulary, 1 + rng.rand(len(vocabulary)))
+
+def assert_same_analysis(a, b):
+    assert a.text == b.text and a.tokens == b.tokens
+    for name in ['token_starts', 'token_ends', 'feature_ids', 'feature_token_starts', 'feature_token_ends']:
+        assert np.array_equal(getattr(a, name), getattr(b, name)), name
+    assert np.array_equal(a.x.indices, b.x.indices) and np.array_equal(a.x.data, b.x.data)
+
+def main():
+    rng = np.random.RandomState(0)
+    words = [f'word{i}' for i in range(VOCABULARY_WORDS)]
+    analyzer = make_analyzer(words, rng)
+    incremental_analyzer = IncrementalAnalyzer(analyzer)
+
+    print(f"{'tokens':>8} {'edit':>7} | {'from scratch ms':>15} | {'incremental ms':>14} | {'speedup':>8}")
+    for n_tokens in DOCUMENT_LENGTHS:
+        document_words = list(rng.choice(words, n_tokens))
+        text = ' '.join(document_words)
+        state = incremental_analyzer.analyze(text)
+
+        edits = {
+            'end': text + ' ' + words[0],
+            'middle': ' '.join(document_words[:n_tokens // 2] + [words[1]] + document_words[n_tokens // 2 + 1:]),
+        }
+        for edit_name, edited_text in edits.items():
+            assert_same_analysis(incremental_analyzer.update(state, edited_text).analyzed, analyzer.analyze(edited_text))
+
+            scratch_seconds = min(timeit.repeat(lambda: analyzer.analyze(edited_text), number=1, repeat=N_REPEATS))
+            incremental_seconds = min(timeit.repeat(lambda: incremental_analyzer.update(state, edited_text), number=1, repeat=N_REPEATS))
+            print(f"{n_tokens:>8} {edit_name:>7} | {scratch_seconds * 1e3:>15.3f} | {incremental_seconds * 1e3:>14.3f} | "
+                  f"{scratch_seconds / incremental_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
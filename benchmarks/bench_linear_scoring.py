@@ -0,0 +1,58 @@
+"""
+Benchmark: sklearn `predict_proba` vs. `LinearScorer`, for a single sparse document and for a batch.
+
+Also checks both give the same probabilities. Run from project root:
+    python -m benchmarks.bench_linear_scoring
+"""
+import timeit
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.linear_model import LogisticRegression
+
+from analysis.linear_scoring import LinearScorer
+
+N_FEATURES = 20000
+N_TRAIN = 2000
+N_BATCH = 5000
+N_REPEATS = 500
+
+
+def make_documents(n_documents, rng):
+    X = sp.random(n_documents, N_FEATURES, density=50. / N_FEATURES, format='csr', random_state=rng)
+    X.data = rng.rand(X.nnz)
+    return X
+
+def fit_classifier(n_classes, rng):
+    X = make_documents(N_TRAIN, rng)
+    y = rng.randint(n_classes, size=N_TRAIN)
+    if n_classes == 2:
+        return LogisticRegression(solver='liblinear').fit(X, y)
+    return LogisticRegression(solver='lbfgs', multi_class='multinomial', max_iter=20).fit(X, y)
+
+def measure(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number
+
+def main():
+    rng = np.random.RandomState(0)
+    print(f"{'model':>12} | {'sklearn 1 doc us':>16} {'scorer 1 doc us':>16} | {'sklearn batch ms':>16} {'scorer batch ms':>16}")
+    for name, n_classes in [('binary', 2), ('multinomial', 10)]:
+        clf = fit_classifier(n_classes, rng)
+        scorer = LinearScorer.from_classifier(clf)
+
+        x = make_documents(1, rng)
+        X = make_documents(N_BATCH, rng)
+        assert np.allclose(clf.predict_proba(x), scorer.predict_proba(x))
+        assert np.allclose(clf.predict_proba(x)[0], scorer.predict_proba_row(x.indices, x.data))
+        assert np.allclose(clf.predict_proba(X), scorer.predict_proba(X))
+
+        sklearn_single = measure(lambda: clf.predict_proba(x), N_REPEATS)
+        scorer_single = measure(lambda: scorer.predict_proba_row(x.indices, x.data), N_REPEATS)
+        sklearn_batch = measure(lambda: clf.predict_proba(X), 10)
+        scorer_batch = measure(lambda: scorer.predict_proba(X), 10)
+        print(f"{name:>12} | {sklearn_single * 1e6:>16.1f} {scorer_single * 1e6:>16.1f} | "
+              f"{sklearn_batch * 1e3:>16.2f} {scorer_batch * 1e3:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark: dense vs. sparse-only feature strengths in `part1_analyze_coefficients`.
+
+Compares latency and peak memory allocated per call, across vocabulary sizes, for an input with a fixed number of
+features. Run from project root:
+    python -m benchmarks.bench_sparse_explanation
+"""
+import timeit
+import tracemalloc
+
+import numpy as np
+import scipy.sparse as sp
+
+from analysis.model_analysis_user_review import FeatureDisplayMode, get_feature_strengths
+
+VOCABULARY_SIZES = [1000, 10000, 100000, 1000000]
+N_INPUT_FEATURES = 50
+N_REPEATS = 200
+
+
+def dense_feature_strengths(x, coefficients, display_mode):
+    """
+    Previous implementation, on a dense copy of the row.
+    """
+    x = x.toarray().flatten()
+    coef_feature_products = coefficients * x
+    nonzero_inds = x.nonzero()[0]
+    if display_mode == FeatureDisplayMode.prediction_contribution:
+        return nonzero_inds, coef_feature_products[nonzero_inds]
+    elif display_mode == FeatureDisplayMode.feature_weight:
+        return nonzero_inds, coefficients[nonzero_inds]
+    return nonzero_inds, x[nonzero_inds]
+
+def make_input(vocabulary_size, rng):
+    inds = np.sort(rng.choice(vocabulary_size, N_INPUT_FEATURES, replace=False))
+    data = rng.rand(N_INPUT_FEATURES)
+    data /= np.linalg.norm(data)
+    return sp.csr_matrix((data, inds, [0, N_INPUT_FEATURES]), shape=(1, vocabulary_size))
+
+def measure(fn, *args):
+    seconds = min(timeit.repeat(lambda: fn(*args), number=N_REPEATS, repeat=3)) / N_REPEATS
+    tracemalloc.start()
+    fn(*args)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak_bytes
+
+def main():
+    rng = np.random.RandomState(0)
+    display_mode = FeatureDisplayMode.prediction_contribution
+
+    print(f"{'vocab size':>10} | {'dense us':>10} {'dense KB':>10} | {'sparse us':>10} {'sparse KB':>10} | {'speedup':>8}")
+    for vocabulary_size in VOCABULARY_SIZES:
+        coefficients = rng.randn(vocabulary_size)
+        x = make_input(vocabulary_size, rng)
+
+        dense_inds, dense_values = dense_feature_strengths(x, coefficients, display_mode)
+        sparse_inds, sparse_values = get_feature_strengths(x, coefficients, display_mode)
+        assert np.array_equal(dense_inds, sparse_inds) and np.allclose(dense_values, sparse_values)
+
+        dense_seconds, dense_bytes = measure(dense_feature_strengths, x, coefficients, display_mode)
+        sparse_seconds, sparse_bytes = measure(get_feature_strengths, x, coefficients, display_mode)
+        print(f"{vocabulary_size:>10} | {dense_seconds * 1e6:>10.1f} {dense_bytes / 1024:>10.1f} | "
+              f"{sparse_seconds * 1e6:>10.1f} {sparse_bytes / 1024:>10.1f} | {dense_seconds / sparse_seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
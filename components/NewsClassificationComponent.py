@@ -1,3 +1,4 @@
+import dash
 import dash_html_components as html
 import dash_core_components as dcc
 from dash.dependencies import Input, Output, State
@@ -9,6 +10,7 @@ from components.UserReviewComponent import display_mode_dropdown_options, Featur
 from analysis import model_analysis_news, global_vars
 from analysis.global_vars import UI_STYLES, news_model
 from analysis.misc import rgba
+from analysis.session_store import new_key
 
 
 # input_initial_value = "Designer and Fulbright fellow Stanislas Chaillou has created a project at Harvard utilizing machine learning to explore the future of generative design, bias and architectural style. While studying AI and its potential integration into architectural practice, Chaillou built an entire generation methodology using Generative Adversarial Neural Networks (GANs). Chaillou's project investigates the future of AI through architectural style learning, and his work illustrates the profound impact of style on the composition of floor plans."
@@ -21,9 +23,9 @@ class NewsClassificationComponent(BaseComponent):
 
     def render(self, props=None):
         stores = html.Div([
-            dcc.Store(id='news-processed-text-input-data', storage_type='memory'),
-            dcc.Store(id='news-prediction-output-data', storage_type='memory'),
             dcc.Store(id='target-category-data', storage_type='memory'),
+            # One per page view, each keystroke is analyzed incrementally from the previous text of the session
+            dcc.Store(id='news-session-id', storage_type='memory', data=new_key()),
         ])
         return Container([
             Grid([
@@ -86,102 +88,74 @@ class NewsClassificationComponent(BaseComponent):
         ])
 
     def register_callbacks(self, app):
-        @app.callback(
-            Output('news-processed-text-input-data', 'data'),
-            [Input('news-text-input', 'value')],
-        )
-        def on_news_raw_text_input(text_input):
-            if text_input is None:
-                text_input = ''
-            processed_input = model_analysis_news.preprocess(text_input)
-            return processed_input
-
-        @app.callback(
-            Output('target-category-data', 'data'),
-            [
-                Input('news-prediction-output-pie-chart', 'hoverData'),
-                Input('news-prediction-output-data', 'data') # for default selection (top category)
-            ,]
-        )
-        def on_hover_pie_chart_update_target_category_data(hoverData, prediction_data):
-            if prediction_data is None:
-                return None
-            if hoverData is None:
-                return prediction_data['top_categories_with_probs'][0][0]
-            return hoverData['points'][0]['label']
-
-        @app.callback(
-            [
-                Output('news-prediction-output-data', 'data'),
-                Output('news-prediction-output-pie-chart', 'hoverData'),
-            ],
-            [
-                Input('news-processed-text-input-data', 'data')
-            ],
-        )
-        def on_news_text_input_changed_update_prediction(text_input):
-            assert text_input is not None, 'Must not be None'
-            if text_input == '':
-                return None, None
-            result = model_analysis_news.make_prediction(text_input)
-            return result, None
-            
-        @app.callback(
-            Output('news-prediction-output-top', 'children'),
-            [Input('news-prediction-output-data', 'data')],
-        )
-        def update_top_prediction_output_div(result):
-            if result is None: return None
-            top_categories_with_probs = result['top_categories_with_probs']
-            top_category, top_prob = top_categories_with_probs[0]
-            div = model_analysis_news.make_top_prediction_result_div(top_category, top_prob)
-            return div
-
         @app.callback(
             [
+                Output('news-prediction-output-top', 'children'),
                 Output('news-top-three-categories-div', 'children'),
                 Output('news-prediction-output-pie-chart', 'figure'),
                 Output('news-prediction-output-interactive-figures-segment', 'style'),
-            ],
-            [
-                Input('news-prediction-output-data', 'data')
-            ],
-        )
-        def on_prediction_output_update_pie_figure_and_top_three_categories(result):
-            if result is None: return (None, {}, {'display': 'none'})
-                
-            top_categories_with_probs = result['top_categories_with_probs']
-
-            pie_figure = model_analysis_news.make_prediction_probability_pie_chart(top_categories_with_probs)
-            top_three_categories_div = model_analysis_news.make_top_three_predicted_categories(top_categories_with_probs)
-
-            div_piled_section_style = {
-                'display': 'block',
-            }
-            return top_three_categories_div, pie_figure, div_piled_section_style
-
-        @app.callback(
-            [
                 Output('news-text-input-feature-highlight', 'children'),
                 Output('news-feature-strengths-bar-graph', 'children'),
                 Output('news-feature-analysis-header', 'children'),
+                Output('target-category-data', 'data'),
+            ],
+            [
+                Input('news-text-input', 'value'),
+                Input('news-prediction-output-pie-chart', 'hoverData'),
+                Input('news-feature-display-mode', 'value'),
             ],
             [
-                Input('target-category-data', 'data'),
-                Input('news-processed-text-input-data', 'data'),
-                Input('news-feature-display-mode', 'value')
+                State('target-category-data', 'data'),
+                State('news-session-id', 'data'),
             ],
         )
-        def on_news_text_input_changed_update_feature_highlight(target_category, text_input, display_mode):
-            assert text_input is not None, 'Must not be None.'
+        def on_news_input_update_analysis(text_input, hoverData, display_mode, target_category, session_id):
+            """
+            The whole news analysis in one round trip: a text change updates prediction, top-3, pie chart and the
+            highlights of the top category. Hovering the pie chart, or changing display mode, only updates highlights.
+            """
+            triggered_prop_ids = {t['prop_id'] for t in dash.callback_context.triggered}
+            is_text_changed = 'news-text-input.value' in triggered_prop_ids or not (
+                triggered_prop_ids & {'news-prediction-output-pie-chart.hoverData', 'news-feature-display-mode.value'})
+
+            if text_input is None or model_analysis_news.preprocess(text_input, session_id=session_id) == '':
+                return (None, None, {}, {'display': 'none'}, None, None, 'Feature Analysis', None)
+
+            if is_text_changed:
+                result = model_analysis_news.make_prediction(text_input)
+                top_categories_with_probs = result['top_categories_with_probs']
+                top_category, top_prob = top_categories_with_probs[0]
+                target_category = top_category
+
+                top_prediction_div = model_analysis_news.make_top_prediction_result_div(top_category, top_prob)
+                top_three_categories_div = model_analysis_news.make_top_three_predicted_categories(top_categories_with_probs)
+                pie_figure = model_analysis_news.make_prediction_probability_pie_chart(top_categories_with_probs)
+                div_piled_section_style = {
+                    'display': 'block',
+                }
+            else:
+                # Prediction outputs stay as they are
+                top_prediction_div = top_three_categories_div = pie_figure = div_piled_section_style = dash.no_update
+                if 'news-prediction-output-pie-chart.hoverData' in triggered_prop_ids and hoverData is not None:
+                    target_category = hoverData['points'][0]['label']
+                if target_category is None:
+                    return (dash.no_update,) * 8
 
-            if target_category is None or text_input == '': return (None, None, 'Feature Analysis')
             news_highlighted_div, bar_figure = model_analysis_news.make_news_feature_highlights_bar_graph_div(
                 text_input, 
                 target_category, 
                 FeatureDisplayMode(display_mode),
             )
-            return (news_highlighted_div, dcc.Graph(figure=bar_figure, config={'displayModeBar': False}), f'Feature Analysis - {target_category}')
+            return (
+                top_prediction_div,
+                top_three_categories_div,
+                pie_figure,
+                div_piled_section_style,
+                news_highlighted_div,
+                dcc.Graph(figure=bar_figure, config={'displayModeBar': False}),
+                f'Feature Analysis - {target_category}',
+                target_category,
+            )
 
         @app.callback(
             Output('news-text-input', 'value'),
@@ -1,15 +1,18 @@
+import os
+
 import dash_html_components as html
 import dash_core_components as dcc
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction
 from components.utils import *
 from components.base_component import BaseComponent
 from analysis import model_analysis_user_review
 from analysis.global_vars import user_review_model
 from analysis.global_vars import UI_STYLES
 from analysis.model_analysis_user_review import FeatureDisplayMode, map_to_new_low_and_high
+from analysis.feature_stats import SORT_KEYS
 from analysis.misc import rgba
+from analysis.session_store import session_store, new_key
 
-import re
 import numpy as np 
 
 display_mode_dropdown_options = [
@@ -18,6 +21,15 @@ display_mode_dropdown_options = [
     ('TF-IDF', FeatureDisplayMode.raw_feature_tfidf.value)
 ]
 
+all_features_order_dropdown_options = [
+    ('Highest first', 'descending'),
+    ('Lowest first', 'ascending'),
+]
+
+# Send all sorted feature contributions to the browser once, and re-slice the sentiment prediction chart for the top-k
+# slider there (`assets/main.js`), instead of a server round trip per slider change.
+SP_CHART_CLIENTSIDE = os.environ.get('SP_CHART_CLIENTSIDE', '0') == '1'
+
 input_initial_value = "Came in for some good after a long day at work. Some of the food I wanted wasn't ready, and I understand that, but the employee Bianca refused to tell"
 #'Insert your favorite review here!'
 
@@ -29,6 +41,9 @@ class UserReviewComponent(BaseComponent):
         stores = html.Div([
             dcc.Store(id='text_input', storage_type='memory'),
             dcc.Store(id='sp_data', storage_type='memory'),
+            dcc.Store(id='sp_chart_data', storage_type='memory'),
+            # One per page view, each keystroke is analyzed incrementally from the previous text of the session
+            dcc.Store(id='review-session-id', storage_type='memory', data=new_key()),
         ])
         return Container([
             Grid([
@@ -125,6 +140,25 @@ class UserReviewComponent(BaseComponent):
                     ])),
                 ]),
                 html.Div(className="ui divider"),
+                Row([
+                    MultiColumn(16, html.H3("All features in the training set")),
+                    MultiColumn(5, dcc.Dropdown(
+                        id='all-features-sort-key',
+                        options=[{'label': lb, 'value': value} for value, lb in SORT_KEYS.items()],
+                        value='document_frequency',
+                        searchable=False,
+                        clearable=False,
+                    )),
+                    MultiColumn(4, dcc.Dropdown(
+                        id='all-features-order',
+                        options=[{'label': lb, 'value': value} for lb, value in all_features_order_dropdown_options],
+                        value='descending',
+                        searchable=False,
+                        clearable=False,
+                    )),
+                    MultiColumn(16, html.Div(id='all-features-table')),
+                ]),
+                html.Div(className="ui divider"),
                 Row([MultiColumn(16, html.H3("Information Value (IV) from the training set"))] +
                     [MultiColumn(8, dcc.Graph(figure=fig, config={'displayModeBar': False}))
                     for fig in model_analysis_user_review.get_information_values_for_top_positive_and_negative_features()]
@@ -161,20 +195,20 @@ class UserReviewComponent(BaseComponent):
             feature_color = pos_color if value > 0 else neg_color
 
             def get_formatted_list_from_samples_and_probs(samples, probs, highlight_color):
-                def get_formatted_list_item(sentence):
-                    # Here we split sentence by 'feature', then join it back with Span of 'feature', to show highlighting effects.
-                    non_match_components = re.compile(f'\\b{feature}\\b').split(sentence.lower()) # lowercase here to make things simpler                
-                    inserted_span_feature_in_between_result = ['"']
-                    for comp in non_match_components:
-                        inserted_span_feature_in_between_result.append(comp)
-                        inserted_span_feature_in_between_result.append(html.Span(feature, className='feature-tag-highlighted', style={'border-radius': 6, 'background-color': highlight_color}))
-                    inserted_span_feature_in_between_result.pop() # remove last one
-                    inserted_span_feature_in_between_result.append('"')
-                    return inserted_span_feature_in_between_result
+                def get_formatted_list_item(pieces):
+                    # `pieces`: (text, matched feature or None), see `span_attribution.split_text_by_spans`
+                    children = ['"']
+                    for text, matched_feature in pieces:
+                        if matched_feature is None:
+                            children.append(text)
+                        else:
+                            children.append(html.Span(text, className='feature-tag-highlighted', style={'border-radius': 6, 'background-color': highlight_color}))
+                    children.append('"')
+                    return children
 
                 return html.Ul([
-                    html.Li(get_formatted_list_item(sentence))
-                    for sentence, prob in zip(samples, probs)
+                    html.Li(get_formatted_list_item(pieces))
+                    for pieces, prob in zip(samples, probs)
                 ])
 
             sentence_samples_div_children = []
@@ -211,15 +245,40 @@ class UserReviewComponent(BaseComponent):
             return explaination_div, { 'display': 'block' }, { 'display': 'none' }
             
 
+        @app.callback(
+            Output('all-features-table', 'children'),
+            [
+                Input('all-features-sort-key', 'value'),
+                Input('all-features-order', 'value'),
+            ]
+        )
+        def on_all_features_sort_change(sort_key, order):
+            rows = model_analysis_user_review.part1_get_all_features_table(sort_key, descending=(order == 'descending'), top_n=20)
+
+            header = html.Tr([html.Th('Feature')] + [html.Th(label) for label in SORT_KEYS.values()])
+            body = []
+            for feature, stats in rows:
+                feature_color = rgba(*(UI_STYLES.POSITIVE_COLOR if stats['mean_contribution'] > 0 else UI_STYLES.NEGATIVE_COLOR), 0.7)
+                body.append(html.Tr([
+                    html.Td(html.Span(feature, style={'border-radius': 6, 'background-color': feature_color})),
+                    html.Td(stats['document_frequency']),
+                    html.Td(stats['positive_count']),
+                    html.Td(stats['negative_count']),
+                    html.Td(f"{stats['mean_pred_prob']:.3f}"),
+                    html.Td(f"{stats['mean_contribution']:.3f}"),
+                ]))
+            return html.Table([html.Thead(header), html.Tbody(body)], className='ui compact celled table')
+
         ########################################
         # MEMORY DATA 
         ########################################
         @app.callback(
             Output('text_input', 'data'),
-            [Input('input-text', component_property='value')])
-        def on_raw_input_text_update(raw_input_text):
+            [Input('input-text', component_property='value')],
+            [State('review-session-id', 'data')])
+        def on_raw_input_text_update(raw_input_text, session_id):
             # existing_text = data.get('preprocessed_input', '')
-            new_text = model_analysis_user_review.preprocess(raw_input_text)
+            new_text = model_analysis_user_review.preprocess(raw_input_text, session_id=session_id)
             return new_text
 
         @app.callback(
@@ -227,16 +286,16 @@ class UserReviewComponent(BaseComponent):
             [
                 Input(component_id='input-text', component_property='value'),
             ],
+            [State('review-session-id', 'data')],
         )
-        def on_enter_input_text(input_text):
+        def on_enter_input_text(input_text, session_id):
             if input_text == '':
                 return html.Div('Empty input text.')
 
-            input_text = model_analysis_user_review.preprocess(input_text)
+            tokens = model_analysis_user_review.analyze_text(input_text, session_id=session_id).tokens
             feature_names_set = user_review_model.feature_names_set
 
             splitted_text_tags = []
-            tokens = input_text.split()
             for w in (tokens):
                 is_unseen = w not in feature_names_set
                 new_tag = None
@@ -254,35 +313,53 @@ class UserReviewComponent(BaseComponent):
 
             return html.Div(splitted_text_tags)
 
-        @app.callback(Output('top-k-slider-label', 'children'), [Input('sp-top-k-slider', 'value')])
-        def update_top_k_slider_label(top_k_value):
-            return f'Show Top-{top_k_value} features'
-
-        @app.callback(
-            Output('sentiment-prediction-graph', 'figure'),
-            [
-                Input('sp_data', 'data'),
-                Input('sp-top-k-slider', 'value')
-            ]
-        )
-        def on_sp_data_update(sp_data, top_k_value):
-            if sp_data is None:
-                return {}
-            return model_analysis_user_review.part1_create_sentiment_prediction_figure(sp_data, top_k=top_k_value)
+        if SP_CHART_CLIENTSIDE:
+            app.clientside_callback(
+                ClientsideFunction('sentiment_prediction', 'topKLabel'),
+                Output('top-k-slider-label', 'children'),
+                [Input('sp-top-k-slider', 'value')],
+            )
+
+            app.clientside_callback(
+                ClientsideFunction('sentiment_prediction', 'figure'),
+                Output('sentiment-prediction-graph', 'figure'),
+                [
+                    Input('sp_chart_data', 'data'),
+                    Input('sp-top-k-slider', 'value'),
+                ],
+            )
+        else:
+            @app.callback(Output('top-k-slider-label', 'children'), [Input('sp-top-k-slider', 'value')])
+            def update_top_k_slider_label(top_k_value):
+                return f'Show Top-{top_k_value} features'
+
+            @app.callback(
+                Output('sentiment-prediction-graph', 'figure'),
+                [
+                    Input('sp_data', 'data'),
+                    Input('sp-top-k-slider', 'value')
+                ]
+            )
+            def on_sp_data_update(sp_data_handle, top_k_value):
+                sp_data = session_store.get(sp_data_handle)
+                if sp_data is None:
+                    return {}
+                return model_analysis_user_review.part1_create_sentiment_prediction_figure(sp_data, top_k=top_k_value)
 
         @app.callback(
             [
                 Output('coef-weight-graph', 'figure'),
                 Output('sorted-features', 'children'),
                 Output('prediction-output', 'children'),
-                Output('sp_data', 'data'),
+                Output('sp_chart_data' if SP_CHART_CLIENTSIDE else 'sp_data', 'data'),
             ],
             [
                 Input('text_input', 'data'),
                 Input('weight-display-mode', 'value')
-            ]
+            ],
+            [State('review-session-id', 'data')]
         )
-        def on_enter_input_text_show_weights(text_input, display_mode):
+        def on_enter_input_text_show_weights(text_input, display_mode, session_id):
             preprocessed_input = text_input
 
             try:
@@ -364,7 +441,10 @@ class UserReviewComponent(BaseComponent):
             style={
                 'display': 'block',
             })
-            return figure_fc, detected_feature_tags_div, prediction_output_div, sp_data
+            if SP_CHART_CLIENTSIDE:
+                return figure_fc, detected_feature_tags_div, prediction_output_div, model_analysis_user_review.part1_create_sentiment_prediction_chart_data(sp_data)
+            # With a server-side store, the browser only keeps a handle and `on_sp_data_update` reads sp_data back from it
+            return figure_fc, detected_feature_tags_div, prediction_output_div, session_store.put(session_id, sp_data)
         @app.callback(
             Output('input-text', 'value'),
             [
@@ -1 +1 @@
-gunicorn -w 4 -k eventlet --timeout 90 -b 127.0.0.1:3002 app:server
+PRELOAD_MODELS=1 SESSION_STORE_BACKEND=disk SESSION_STORE_DIR=/dev/shm/model-explanation-sessions gunicorn --preload -w 4 -k eventlet --timeout 90 -b 127.0.0.1:3002 app:server